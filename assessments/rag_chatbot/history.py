@@ -0,0 +1,55 @@
+from collections import OrderedDict, deque
+from core.config import settings
+from uuid import UUID
+import threading
+
+
+class ChatHistoryCache:
+    """Ring buffer of the most recent turns per session, bounded in sessions with LRU eviction.
+
+    A session is only resident after it has been read from the database once, so the buffer is
+    always a faithful tail of `rag_chat_history` for this process; writes append to it in place.
+    """
+
+    def __init__(self, max_sessions: int, max_messages: int):
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._sessions: OrderedDict[UUID, deque[tuple[str, str]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, session_id: UUID) -> list[tuple[str, str]] | None:
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                self._stats["misses"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return list(turns)
+
+    def fill(self, session_id: UUID, messages: list[tuple[str, str]]):
+        with self._lock:
+            self._sessions[session_id] = deque(messages, maxlen=self.max_messages)
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def append(self, session_id: UUID, messages: list[tuple[str, str]]):
+        with self._lock:
+            turns = self._sessions.get(session_id)
+            # sessions that are not resident will be loaded from the database on their next read
+            if turns is not None:
+                turns.extend(messages)
+                self._sessions.move_to_end(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "sessions": len(self._sessions)}
+
+
+chat_history_cache = ChatHistoryCache(
+    max_sessions=settings.chat_history_cache_sessions,
+    max_messages=settings.chat_history_messages,
+)
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os, sys
+
+# ensure project root is on Python path so imports work regardless of cwd
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
+if root not in sys.path:
+    sys.path.insert(0, root)
+
+from core.faiss_index import INDEX_TYPES, index_memory_bytes, index_report, index_type_of
+from core.vector_store import VectorStoreManager
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Inspect, benchmark, migrate and roll back a company's FAISS shard")
+    parser.add_argument("--company-id", default="acme-corp")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    migrate = sub.add_parser("migrate", help="Rebuild the shard with another index type and save it")
+    migrate.add_argument("--index-type", choices=INDEX_TYPES, required=True)
+
+    sub.add_parser("generations", help="List the shard's index generations on disk")
+    rollback = sub.add_parser("rollback", help="Make an earlier generation live again")
+    rollback.add_argument("--generation", default=None, help="defaults to the one before the live generation")
+
+    report = sub.add_parser("report", help="Memory footprint and recall of each index type against flat search")
+    report.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    report.add_argument("--k", type=int, default=6)
+    report.add_argument("--queries", type=int, default=200, help="stored vectors reused as queries")
+    report.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    return parser.parse_args()
+
+def main(args):
+    if args.command == "rollback":
+        try:
+            generation = VectorStoreManager.rollback(args.company_id, args.generation)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"⏪ {args.company_id} is now serving generation {generation}")
+        return
+    if args.command == "generations":
+        current = VectorStoreManager.current_generation(args.company_id)
+        for generation in VectorStoreManager.generations(args.company_id):
+            path = VectorStoreManager.generation_path(args.company_id, generation)
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            print(f"{'*' if generation == current else ' '} {generation}  {size:>14,} bytes")
+        return
+
+    if args.command == "migrate":
+        vectorstore, manifest = VectorStoreManager.checkout(args.company_id)
+    else:
+        vectorstore = VectorStoreManager.get_vectorstore(args.company_id)
+    index = vectorstore.index
+    print(f"📦 {args.company_id}: {index.ntotal} vectors, {index_type_of(index)} index, {index_memory_bytes(index):,} bytes")
+
+    if args.command == "migrate":
+        if not VectorStoreManager.ensure_index_type(vectorstore, args.index_type):
+            print(f"⚠️  Nothing to do: already {args.index_type}, or too few vectors to train it")
+            return
+        generation = VectorStoreManager.publish(args.company_id, vectorstore, manifest)
+        print(f"✅ Migrated to {args.index_type} as generation {generation}: {index_memory_bytes(vectorstore.index):,} bytes")
+        return
+
+    # exact vectors for the baseline: a PQ shard's own codes would make every type look like PQ
+    vectors = VectorStoreManager.exact_vectors(vectorstore)
+    if not len(vectors):
+        print("⚠️  Shard is empty, ingest documents first")
+        return
+    rows = index_report(vectors, args.index_types, k=args.k, n_queries=args.queries)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'index':<10}{'build s':>9}{'bytes/vec':>11}{'recall@' + str(args.k):>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for row in rows:
+        if "error" in row:
+            print(f"{row['index_type']:<10}  {row['error']}")
+            continue
+        print(
+            f"{row['index_type']:<10}{row['build_s']:>9}{row['bytes_per_vector']:>11}"
+            f"{row['recall_at_k']:>10}{row['p50_ms']:>9}{row['p99_ms']:>9}"
+        )
+
+if __name__ == "__main__":
+    main(parse_args())
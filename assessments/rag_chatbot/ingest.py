@@ -7,7 +7,9 @@ root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.par
 if root not in sys.path:
     sys.path.insert(0, root)
 
-from assessments.rag_chatbot.services import RAGService
+from assessments.rag_chatbot.jobs import ingest_jobs
+from assessments.rag_chatbot.schemas import IngestJobStatus
+from core.database import init_db
 
 def parse_args():
     import argparse
@@ -22,9 +24,34 @@ def parse_args():
 
 async def main(company_id: str, docs_path: str):
     print("🚀 Ingesting company documents...")
-    count = await RAGService.ingest_documents(company_id, docs_path)
-    print(f"✅ Ingested {count} chunks for {company_id}")
+    await init_db()
+    job = await ingest_jobs.submit(company_id, docs_path)
+    print(f"   job {job.job_id}")
+    waiter = asyncio.ensure_future(ingest_jobs.wait(job.job_id))
+    try:
+        while not waiter.done():
+            await asyncio.wait([waiter], timeout=2)
+            if not waiter.done():
+                job = await ingest_jobs.get(job.job_id)
+                print(f"   {job.files_processed}/{job.files_total} files, {job.chunks_embedded} chunks ({job.chunks_per_second or 0} chunks/s)")
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # stop at the next file boundary and let the job record itself as cancelled
+        await ingest_jobs.cancel(job.job_id)
+        await waiter
+    job = waiter.result()
+
+    if job.status != IngestJobStatus.succeeded:
+        print(f"❌ Ingest {job.status.value}: {'; '.join(job.errors) or 'no error recorded'}")
+        sys.exit(1)
+    print(f"✅ Embedded {job.chunks_embedded} chunks for {company_id} in {job.elapsed_seconds}s ({job.chunks_per_second} chunks/s)")
+    for label in ("added", "updated", "removed", "skipped"):
+        counts = job.result[label]
+        print(f"   {label:<8} {counts['files']:>5} files  {counts['chunks']:>6} chunks")
+    for failure in job.result["failed"]:
+        print(f"   ⚠️  skipped {failure['source']}: {failure['error']}")
+    if job.result["unsupported"]:
+        print(f"   ignored  {len(job.result['unsupported']):>5} files with no loader: {', '.join(job.result['unsupported'])}")
 
 if __name__ == "__main__":
     args = parse_args()
-    asyncio.run(main(args.company_id, args.docs_path))
\ No newline at end of file
+    asyncio.run(main(args.company_id, args.docs_path))
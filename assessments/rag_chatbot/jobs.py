@@ -0,0 +1,270 @@
+from assessments.rag_chatbot.schemas import IngestJob, IngestJobRead, IngestJobStatus, IngestProgress
+from assessments.rag_chatbot.services import RAGService
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.exceptions import DatabaseError, IngestCancelledError, NotFoundError
+from core.metrics import register_stats
+from core.vector_store import VectorStoreManager
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+import asyncio
+import os
+import socket
+import structlog
+
+logger = structlog.get_logger()
+
+ACTIVE = (IngestJobStatus.queued, IngestJobStatus.running)
+FINISHED = (IngestJobStatus.succeeded, IngestJobStatus.failed, IngestJobStatus.cancelled)
+
+
+class IngestJobManager:
+    """Runs ingests as background tasks, one at a time per company, with their progress in `rag_ingest_jobs`.
+
+    A job is claimed by inserting its row: a partial unique index allows one queued or running row per
+    company, so with several worker processes a second submit gets the existing job back instead of
+    starting another ingest into the same shard. The owning worker writes its counters and a heartbeat
+    every `INGEST_JOB_PERSIST_SECONDS` and reads back `cancel_requested`, so any worker can cancel it;
+    a job whose heartbeat is older than `INGEST_JOB_STALE_SECONDS` is taken to have lost its worker.
+    """
+
+    def __init__(self, persist_seconds: float, stale_seconds: float):
+        self.persist_seconds = persist_seconds
+        self.stale_seconds = stale_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self._progress: dict[UUID, IngestProgress] = {}
+        self._tasks: dict[UUID, asyncio.Task] = {}
+
+    async def submit(self, company_id: str, docs_path: str = "data/uploads/02_rag/company_docs") -> IngestJobRead:
+        VectorStoreManager.validate_company_id(company_id)
+        # another attempt only follows a claim that lost to a job which has since finished or gone stale
+        for _ in range(3):
+            job = IngestJob(company_id=company_id, docs_path=docs_path, owner=self.owner, heartbeat_at=datetime.utcnow())
+            if await self._claim(job):
+                self._progress[job.id] = IngestProgress()
+                self._tasks[job.id] = asyncio.create_task(self._run(job), name=f"ingest-{company_id}")
+                logger.info("ingest_job_submitted", job_id=str(job.id), company_id=company_id, owner=self.owner)
+                return self._read(job)
+            active = await self._active_job(company_id)
+            if active is not None and not await self._expire_if_stale(active):
+                return self._read(active)
+        raise DatabaseError(f"Could not claim an ingest job for {company_id}")
+
+    async def get(self, job_id: UUID) -> IngestJobRead:
+        job = await self._load(job_id)
+        if job.status in ACTIVE and job.id not in self._tasks and await self._expire_if_stale(job):
+            job = await self._load(job_id)
+        return self._read(job)
+
+    async def cancel(self, job_id: UUID) -> IngestJobRead:
+        # the owning worker reads the flag back with its next heartbeat and stops at the next file,
+        # so the shard is never left half written
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(IngestJob)
+                .where(IngestJob.id == job_id, IngestJob.status.in_(ACTIVE))
+                .values(cancel_requested=True)
+            )
+            await session.commit()
+        progress = self._progress.get(job_id)
+        if progress is not None:
+            progress.cancel_requested = True
+        job = await self.get(job_id)
+        if result.rowcount:
+            logger.info("ingest_job_cancel_requested", job_id=str(job_id), company_id=job.company_id)
+        return job
+
+    async def wait(self, job_id: UUID) -> IngestJobRead:
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+        return await self.get(job_id)
+
+    async def recover(self):
+        """Mark queued or running jobs whose worker stopped heartbeating as failed; live workers' jobs are left alone."""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestJob).where(IngestJob.status.in_(ACTIVE), self._stale_clause())
+            )
+            candidates = result.scalars().all()
+        stale = [job for job in candidates if job.id not in self._tasks and await self._expire_if_stale(job)]
+        if stale:
+            logger.warning("ingest_jobs_interrupted", count=len(stale))
+
+    async def aclose(self):
+        for progress in self._progress.values():
+            progress.cancel_requested = True
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run(self, job: IngestJob):
+        progress = self._progress[job.id]
+        heartbeat = None
+        try:
+            job.status = IngestJobStatus.running
+            job.started_at = datetime.utcnow()
+            if await self._save(job):
+                progress.cancel_requested = True
+            heartbeat = asyncio.create_task(self._heartbeat(job, progress))
+            result = await RAGService.ingest_documents(job.company_id, job.docs_path, progress=progress)
+            job.result = result.model_dump()
+            job.status = IngestJobStatus.succeeded
+        except IngestCancelledError:
+            job.status = IngestJobStatus.cancelled
+        except Exception as e:
+            logger.error("ingest_job_failed", job_id=str(job.id), company_id=job.company_id, error=str(e))
+            progress.errors.append(str(e))
+            job.status = IngestJobStatus.failed
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+            job.finished_at = datetime.utcnow()
+            self._apply(job, progress)
+            try:
+                await self._save(job)
+            finally:
+                self._progress.pop(job.id, None)
+                self._tasks.pop(job.id, None)
+        read = self._read(job)
+        logger.info(
+            "ingest_job_finished",
+            job_id=str(job.id),
+            company_id=job.company_id,
+            status=job.status.value,
+            elapsed_seconds=read.elapsed_seconds,
+            chunks_per_second=read.chunks_per_second,
+        )
+
+    async def _heartbeat(self, job: IngestJob, progress: IngestProgress):
+        while True:
+            await asyncio.sleep(self.persist_seconds)
+            self._apply(job, progress)
+            if await self._save(job):
+                progress.cancel_requested = True
+
+    @staticmethod
+    def _apply(job: IngestJob, progress: IngestProgress):
+        job.files_total = progress.files_total
+        job.files_processed = progress.files_processed
+        job.chunks_embedded = progress.chunks_embedded
+        job.errors = list(progress.errors)
+
+    @staticmethod
+    async def _claim(job: IngestJob) -> bool:
+        async with AsyncSessionLocal() as session:
+            session.add(job)
+            try:
+                await session.commit()
+            except IntegrityError:
+                # the partial unique index: the company already has a queued or running job
+                return False
+        return True
+
+    async def _save(self, job: IngestJob) -> bool:
+        """Write the job's state and heartbeat; returns True if it should stop (cancelled, or its claim expired)."""
+        job.heartbeat_at = datetime.utcnow()
+        async with AsyncSessionLocal() as session:
+            # only columns this worker owns, so a concurrent cancel_requested is not overwritten
+            result = await session.execute(
+                update(IngestJob)
+                .where(IngestJob.id == job.id, IngestJob.status.in_(ACTIVE))
+                .values(
+                    status=job.status,
+                    files_total=job.files_total,
+                    files_processed=job.files_processed,
+                    chunks_embedded=job.chunks_embedded,
+                    errors=job.errors,
+                    result=job.result,
+                    started_at=job.started_at,
+                    finished_at=job.finished_at,
+                    heartbeat_at=job.heartbeat_at,
+                )
+            )
+            job.cancel_requested = bool(
+                await session.scalar(select(IngestJob.cancel_requested).where(IngestJob.id == job.id))
+            )
+            await session.commit()
+        if not result.rowcount:
+            # another worker expired the job as stale and may already be running a new one
+            logger.warning("ingest_job_claim_lost", job_id=str(job.id), company_id=job.company_id)
+            return True
+        return job.cancel_requested
+
+    @staticmethod
+    async def _load(job_id: UUID) -> IngestJob:
+        async with AsyncSessionLocal() as session:
+            job = await session.get(IngestJob, job_id)
+        if job is None:
+            raise NotFoundError(f"Ingest job {job_id} not found")
+        return job
+
+    @staticmethod
+    async def _active_job(company_id: str) -> IngestJob | None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(IngestJob).where(IngestJob.company_id == company_id, IngestJob.status.in_(ACTIVE))
+            )
+            return result.scalars().first()
+
+    def _stale_clause(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        return or_(IngestJob.heartbeat_at.is_(None), IngestJob.heartbeat_at < cutoff)
+
+    async def _expire_if_stale(self, job: IngestJob) -> bool:
+        # conditional on the heartbeat, so a worker that wrote in the meantime keeps its job
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(IngestJob)
+                .where(IngestJob.id == job.id, IngestJob.status.in_(ACTIVE), self._stale_clause())
+                .values(
+                    status=IngestJobStatus.failed,
+                    errors=[*(job.errors or []), f"worker {job.owner} stopped heartbeating"],
+                    finished_at=datetime.utcnow(),
+                )
+            )
+            await session.commit()
+        if result.rowcount:
+            logger.warning("ingest_job_expired", job_id=str(job.id), company_id=job.company_id, owner=job.owner)
+        return bool(result.rowcount)
+
+    def _read(self, job: IngestJob) -> IngestJobRead:
+        counters = {
+            "files_total": job.files_total,
+            "files_processed": job.files_processed,
+            "chunks_embedded": job.chunks_embedded,
+            "errors": job.errors,
+        }
+        progress = self._progress.get(job.id)
+        if progress is not None and job.status not in FINISHED:
+            # the row may be a few seconds behind a job running in this process
+            counters = progress.model_dump(exclude={"cancel_requested"})
+        cancel_requested = bool(job.cancel_requested) or (progress is not None and progress.cancel_requested)
+        elapsed = None
+        if job.started_at is not None:
+            elapsed = max(((job.finished_at or datetime.utcnow()) - job.started_at).total_seconds(), 1e-6)
+        return IngestJobRead(
+            job_id=job.id,
+            company_id=job.company_id,
+            status=job.status,
+            result=job.result,
+            cancel_requested=cancel_requested,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            elapsed_seconds=round(elapsed, 3) if elapsed is not None else None,
+            files_per_second=round(counters["files_processed"] / elapsed, 2) if elapsed else None,
+            chunks_per_second=round(counters["chunks_embedded"] / elapsed, 2) if elapsed else None,
+            **counters,
+        )
+
+    def stats(self) -> dict:
+        return {"active": len(self._tasks)}
+
+
+ingest_jobs = IngestJobManager(
+    persist_seconds=settings.ingest_job_persist_seconds, stale_seconds=settings.ingest_job_stale_seconds
+)
+register_stats("ingest_jobs", ingest_jobs.stats)
@@ -0,0 +1,156 @@
+"""Per-extension document loaders and the process pool ingestion parses files in.
+
+Everything a worker runs is importable from this module alone, so spawned workers do not pull in
+the app, its settings or an event loop.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import AsyncIterator, Callable
+import asyncio
+import multiprocessing
+import os
+import time
+
+
+def _load_text(path: str) -> list[Document]:
+    from langchain_community.document_loaders import TextLoader
+
+    return TextLoader(path, encoding="utf-8").load()
+
+
+def _load_pdf(path: str) -> list[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    return PyPDFLoader(path).load()
+
+
+def _load_html(path: str) -> list[Document]:
+    from langchain_community.document_loaders import BSHTMLLoader
+
+    # the stdlib parser, so lxml is not required
+    return BSHTMLLoader(path, open_encoding="utf-8", bs_kwargs={"features": "html.parser"}, get_text_separator="\n").load()
+
+
+def _load_docx(path: str) -> list[Document]:
+    from langchain_community.document_loaders import Docx2txtLoader
+
+    return Docx2txtLoader(path).load()
+
+
+LOADERS: dict[str, Callable[[str], list[Document]]] = {
+    ".txt": _load_text,
+    ".md": _load_text,
+    ".markdown": _load_text,
+    ".pdf": _load_pdf,
+    ".html": _load_html,
+    ".htm": _load_html,
+    ".docx": _load_docx,
+}
+
+
+def supported(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in LOADERS
+
+
+def parse_file(path: str, company_id: str, chunk_size: int, chunk_overlap: int) -> tuple[list[Document], float]:
+    """Load and split one file; returns the chunks and the seconds it took. Runs in a pool worker."""
+    started = time.perf_counter()
+    loader = LOADERS.get(os.path.splitext(path)[1].lower())
+    if loader is None:
+        raise ValueError(f"unsupported file type {os.path.splitext(path)[1] or '(none)'}")
+    docs = loader(path)
+    for doc in docs:
+        doc.metadata["company_id"] = company_id
+        doc.metadata["source"] = doc.metadata.get("source", path)
+    # start_index lets the prompt builder stitch overlapping neighbours back together
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    return splitter.split_documents(docs), time.perf_counter() - started
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+
+
+def parse_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_parse_pool()
+        # spawn, not fork: the parent has FAISS/OpenMP and event-loop threads that fork would copy mid-state
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def parse_files(
+    paths: list[str],
+    company_id: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    workers: int,
+) -> AsyncIterator[tuple[str, list[Document] | Exception, float]]:
+    """Parse `paths` in the pool and yield ``(path, chunks or error, seconds)`` as each file finishes.
+
+    Only ``2 * workers`` files are in flight, so parsed chunks never pile up ahead of the embedding stage.
+    Files lost to a crashed worker are retried once, each on its own in a fresh pool, and reported as
+    failed only if that breaks the pool too.
+    """
+    loop = asyncio.get_running_loop()
+    pending: dict[asyncio.Future, tuple[str, ProcessPoolExecutor]] = {}
+    queue = iter(paths)
+    retry: list[str] = []
+    retried: set[str] = set()
+
+    def submit():
+        while len(pending) < 2 * workers:
+            if any(path in retried for path, _ in pending.values()):
+                return
+            if retry:
+                # a retried file runs on its own, so if the pool breaks again the crash is its own
+                if pending:
+                    return
+                path = retry.pop()
+            else:
+                path = next(queue, None)
+            if path is None:
+                return
+            pool = parse_pool(workers)
+            pending[loop.run_in_executor(pool, parse_file, path, company_id, chunk_size, chunk_overlap)] = path, pool
+
+    submit()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                path, pool = pending.pop(future)
+                try:
+                    if future.cancelled():
+                        # shutting a broken pool down cancels the files it had not started
+                        raise BrokenProcessPool("parse pool was shut down")
+                    chunks, seconds = future.result()
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool):
+                        if _pool is pool:
+                            # a worker died (e.g. a parser crashed); start a fresh pool for what is left.
+                            # Only for the pool that broke: late failures from it must not take down its replacement
+                            shutdown_parse_pool()
+                        if path not in retried:
+                            # the crash may have been another file's, so each file gets one more go
+                            retried.add(path)
+                            retry.append(path)
+                            continue
+                    yield path, e, 0.0
+                else:
+                    yield path, chunks, seconds
+            submit()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,96 @@
+from langchain_core.documents import Document
+from langchain_community.vectorstores import FAISS
+from core.embedding_client import embedding_client
+from core.config import settings
+from core.metrics import timed
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
+import asyncio
+import structlog
+
+logger = structlog.get_logger()
+
+
+class EmbeddingPipeline:
+    """Embeds chunks in fixed-size batches, a bounded number at a time, adding each batch to the store as it lands.
+
+    At most ``concurrency`` batches are in flight, so memory stays at roughly
+    ``batch_size * (concurrency + 1)`` chunks no matter how large the corpus is.
+    """
+
+    def __init__(
+        self,
+        vectorstore: FAISS,
+        batch_size: int | None = None,
+        concurrency: int | None = None,
+        max_attempts: int | None = None,
+    ):
+        self.vectorstore = vectorstore
+        self.batch_size = batch_size or settings.ingest_batch_size
+        self.max_attempts = max_attempts or settings.ingest_max_attempts
+        self._slots = asyncio.Semaphore(concurrency or settings.ingest_concurrency)
+        self._pending: list[tuple[Document, str]] = []
+        self._tasks: set[asyncio.Task] = set()
+        self._error: BaseException | None = None
+        self.embedded = 0
+        self.batches = 0
+
+    async def add(self, chunk: Document, vector_id: str):
+        self._raise_if_failed()
+        self._pending.append((chunk, vector_id))
+        if len(self._pending) >= self.batch_size:
+            await self._submit()
+
+    async def flush(self) -> int:
+        if self._pending:
+            await self._submit()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._raise_if_failed()
+        return self.embedded
+
+    async def aclose(self):
+        # abandon anything still in flight (used when the ingest itself is failing or cancelled)
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _submit(self):
+        batch, self._pending = self._pending, []
+        # waiting for a free slot is what applies backpressure to the loader
+        await self._slots.acquire()
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[Document, str]]):
+        try:
+            texts = [chunk.page_content for chunk, _ in batch]
+            async for attempt in AsyncRetrying(
+                stop=stop_after_attempt(self.max_attempts),
+                wait=wait_exponential(multiplier=1, min=1, max=10),
+                reraise=True,
+            ):
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        logger.warning("embedding_batch_retry", attempt=attempt.retry_state.attempt_number, size=len(batch))
+                    with timed("ingest", "embed_batch"):
+                        vectors = await embedding_client.get_embeddings().aembed_documents(texts)
+
+            self.vectorstore.add_embeddings(
+                zip(texts, vectors),
+                metadatas=[chunk.metadata for chunk, _ in batch],
+                ids=[vector_id for _, vector_id in batch],
+            )
+            self.embedded += len(batch)
+            self.batches += 1
+        except Exception as e:
+            logger.error("embedding_batch_failed", size=len(batch), error=str(e))
+            if self._error is None:
+                self._error = e
+        finally:
+            self._slots.release()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,203 @@
+from langchain_core.documents import Document
+from core.config import settings
+from functools import lru_cache
+import re
+import structlog
+
+logger = structlog.get_logger()
+
+# chunk ends shorter than this are not treated as a splitter overlap (a shared "the " proves nothing)
+MIN_OVERLAP_CHARS = 20
+# neighbouring chunks at most this far apart (the whitespace the splitter stripped) count as adjacent
+MAX_GAP_CHARS = 4
+# a chunk squeezed in at the end of the context must keep at least this many tokens to be worth it
+MIN_CHUNK_TOKENS = 40
+HISTORY_OMITTED = "[{count} earlier message(s) omitted]"
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(settings.llm.model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its vocabularies on first use; without it fall back to ~4 characters a token
+        logger.warning("tokenizer_unavailable", error=str(e))
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_end: bool = False) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        limit = max_tokens * 4
+        return text[-limit:] if keep_end else text[:limit]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of `left` that is also a prefix of `right`."""
+    limit = min(len(left), len(right))
+    for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_chunks(results: list[tuple[Document, float]]) -> tuple[list[tuple[Document, float]], int]:
+    """Join chunks of the same source (and page) that overlap or touch, keeping the best score.
+
+    Chunks ingested with a ``start_index`` are merged by offset; older ones by matching the overlap text.
+    Returns the merged list in score order and how many chunks were folded into another.
+    """
+    groups: dict[tuple, list[tuple[Document, float]]] = {}
+    for doc, score in results:
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append((doc, score))
+
+    merged, folded = [], 0
+    for items in groups.values():
+        by_offset = all("start_index" in doc.metadata for doc, _ in items)
+        if by_offset:
+            items.sort(key=lambda item: item[0].metadata["start_index"])
+        # each span: [text, best score, first document, end offset in the source]
+        spans = []
+        for doc, score in items:
+            start = doc.metadata["start_index"] if by_offset else None
+            end = start + len(doc.page_content) if by_offset else None
+            if spans and by_offset and start <= spans[-1][3] + MAX_GAP_CHARS:
+                text, best, first, prev_end = spans[-1]
+                # the splitter strips the whitespace between neighbours, so a gap gets a paragraph break
+                joined = text + ("\n\n" + doc.page_content if start > prev_end else doc.page_content[prev_end - start:])
+                spans[-1] = [joined, max(best, score), first, max(end, prev_end)]
+            elif spans and not by_offset and (size := _overlap(spans[-1][0], doc.page_content)):
+                spans[-1][0] += doc.page_content[size:]
+                spans[-1][1] = max(spans[-1][1], score)
+            elif spans and not by_offset and (size := _overlap(doc.page_content, spans[-1][0])):
+                spans[-1] = [doc.page_content + spans[-1][0][size:], max(spans[-1][1], score), doc, None]
+            else:
+                spans.append([doc.page_content, score, doc, end])
+                continue
+            folded += 1
+        for text, score, first, _ in spans:
+            merged.append((Document(page_content=text, metadata=dict(first.metadata)), score))
+    merged.sort(key=lambda item: item[1], reverse=True)
+    return merged, folded
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def drop_near_duplicates(results: list[tuple[Document, float]], threshold: float) -> tuple[list[tuple[Document, float]], int]:
+    """Drop a chunk when at least `threshold` of its word shingles already appear in a higher-scored one.
+
+    Measuring against the candidate (not the union) also catches a short chunk repeated inside a longer one,
+    e.g. the same paragraph copied into two files.
+    """
+    kept, seen, dropped = [], [], 0
+    for doc, score in results:
+        shingles = _shingles(doc.page_content)
+        if any(len(shingles & other) / len(shingles) >= threshold for other in seen):
+            dropped += 1
+            continue
+        seen.append(shingles)
+        kept.append((doc, score))
+    return kept, dropped
+
+
+def fit_history(history: list[tuple[str, str]], budget: int) -> tuple[str, int]:
+    """Newest messages first until `budget` runs out; the oldest one kept may be cut from the front."""
+    lines: list[str] = []
+    used = 0
+    for role, content in reversed(history):
+        line = f"{role}: {content}"
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            if budget - used > MIN_CHUNK_TOKENS:
+                lines.append(f"{role}: …" + truncate_tokens(content, budget - used - 4, keep_end=True))
+            break
+        lines.append(line)
+        used += tokens
+    omitted = len(history) - len(lines)
+    if omitted:
+        lines.append(HISTORY_OMITTED.format(count=omitted))
+    return "\n".join(reversed(lines)), omitted
+
+
+class PromptBuilder:
+    """Assembles RAG context and chat history into a system prompt that fits a token budget.
+
+    Context is filled in score order after overlap merging and near-duplicate removal; history gets at
+    most its own share of the budget, newest messages first.
+    """
+
+    def __init__(self, template: str, budget: int | None = None, history_budget: int | None = None, dedup_similarity: float | None = None):
+        self.template = template
+        self.budget = budget or settings.rag_prompt_token_budget
+        self.history_budget = settings.rag_history_token_budget if history_budget is None else history_budget
+        self.dedup_similarity = settings.rag_dedup_similarity if dedup_similarity is None else dedup_similarity
+
+    def build(
+        self,
+        query: str,
+        results: list[tuple[Document, float]],
+        history: list[tuple[str, str]],
+        **fields,
+    ) -> tuple[str, list[Document]]:
+        """Return the system prompt and the documents whose text made it into the context."""
+        def render(context: str, chat_history: str) -> str:
+            return self.template.format(context=context, chat_history=chat_history or "No previous messages.", **fields)
+
+        naive = render("\n\n".join(doc.page_content for doc, _ in results), "\n".join(f"{r}: {c}" for r, c in history))
+        tokens_before = count_tokens(naive) + count_tokens(query)
+
+        merged, folded = merge_chunks(results)
+        unique, duplicates = drop_near_duplicates(merged, self.dedup_similarity)
+
+        available = self.budget - count_tokens(render("", "")) - count_tokens(query)
+        chat_history, omitted = fit_history(history, min(self.history_budget, max(available, 0)))
+        available -= count_tokens(chat_history)
+
+        parts, used_docs = [], []
+        for doc, _ in unique:
+            tokens = count_tokens(doc.page_content) + 1
+            if tokens > available:
+                if available >= MIN_CHUNK_TOKENS:
+                    parts.append(truncate_tokens(doc.page_content, available - 1))
+                    used_docs.append(doc)
+                break
+            parts.append(doc.page_content)
+            used_docs.append(doc)
+            available -= tokens
+
+        prompt = render("\n\n".join(parts), chat_history)
+        logger.info(
+            "rag_prompt_built",
+            tokens_before=tokens_before,
+            tokens_after=count_tokens(prompt) + count_tokens(query),
+            budget=self.budget,
+            chunks_retrieved=len(results),
+            chunks_merged=folded,
+            chunks_deduplicated=duplicates,
+            chunks_used=len(used_docs),
+            history_messages=len(history),
+            history_omitted=omitted,
+        )
+        return prompt, used_docs
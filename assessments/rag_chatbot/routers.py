@@ -1,29 +1,42 @@
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
 from assessments.rag_chatbot.services import RAGService
-from assessments.rag_chatbot.schemas import RAGResponse, ChatRequest
+from assessments.rag_chatbot.schemas import RAGResponse, ChatRequest, IngestJobRead
+from assessments.rag_chatbot.jobs import ingest_jobs
+from core.vector_store import VectorStoreManager
 from uuid import uuid4, UUID
+import json
 
 router = APIRouter(prefix="/api/02-rag", tags=["Assessment 2"])
 
-@router.post("/ingest")
+@router.post("/ingest", response_model=IngestJobRead, status_code=202)
 async def ingest(company_id: str = "acme-corp"):
-    count = await RAGService.ingest_documents(company_id)
-    return {"status": "success", "chunks_ingested": count, "company_id": company_id}
+    # runs in the background; poll GET /ingest/{job_id}. A company with a job in flight gets that job back.
+    return await ingest_jobs.submit(company_id)
+
+@router.get("/ingest/{job_id}", response_model=IngestJobRead)
+async def ingest_status(job_id: UUID):
+    return await ingest_jobs.get(job_id)
+
+@router.post("/ingest/{job_id}/cancel", response_model=IngestJobRead, status_code=202)
+async def cancel_ingest(job_id: UUID):
+    return await ingest_jobs.cancel(job_id)
 
 from fastapi import Body, Query, HTTPException
 
-@router.post("/chat", response_model=RAGResponse)
-async def chat(
-    query: str | None = Query(None),
-    company_id: str = Query("acme-corp"),
-    session_id: UUID | None = Query(None),
-    req: ChatRequest | None = Body(None),
-):
+def _merge_chat_params(
+    query: str | None,
+    company_id: str,
+    session_id: UUID | None,
+    refine: bool | None,
+    req: ChatRequest | None,
+) -> ChatRequest:
     # merge body and query parameters; body takes precedence
     if req is not None:
         query = req.query
         company_id = req.company_id
         session_id = req.session_id
+        refine = req.refine if req.refine is not None else refine
 
     if not query:
         # mimic FastAPI missing-field error structure for consistency
@@ -31,7 +44,46 @@ async def chat(
             {"loc": ["query"], "msg": "Field required", "type": "value_error.missing"}
         ])
 
+    VectorStoreManager.validate_company_id(company_id)
     if session_id is None:
         session_id = uuid4()
 
-    return await RAGService.chat(company_id, query, session_id)
\ No newline at end of file
+    return ChatRequest(query=query, company_id=company_id, session_id=session_id, refine=refine)
+
+@router.post("/chat", response_model=RAGResponse)
+async def chat(
+    query: str | None = Query(None),
+    company_id: str = Query("acme-corp"),
+    session_id: UUID | None = Query(None),
+    refine: bool | None = Query(None),
+    req: ChatRequest | None = Body(None),
+):
+    req = _merge_chat_params(query, company_id, session_id, refine, req)
+    return await RAGService.chat(req.company_id, req.query, req.session_id, refine=req.refine is not False)
+
+@router.post("/chat/stream")
+async def chat_stream(
+    query: str | None = Query(None),
+    company_id: str = Query("acme-corp"),
+    session_id: UUID | None = Query(None),
+    refine: bool | None = Query(None),
+    req: ChatRequest | None = Body(None),
+):
+    req = _merge_chat_params(query, company_id, session_id, refine, req)
+
+    async def event_stream():
+        try:
+            async for event, payload in RAGService.chat_stream(req.company_id, req.query, req.session_id, refine=bool(req.refine)):
+                yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+        except Exception as e:
+            # headers are already sent, so errors have to travel inside the stream
+            error = {"detail": str(e), "code": getattr(e, "code", "INTERNAL_ERROR")}
+            if getattr(e, "retry_after", None) is not None:
+                error["retry_after"] = e.retry_after
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Session-Id": str(req.session_id)},
+    )
@@ -1,8 +1,9 @@
 from sqlmodel import SQLModel, Field, JSON, Column
+from sqlalchemy import Index, text
 from datetime import datetime
 from uuid import UUID, uuid4
 from pydantic import BaseModel
-from typing import Literal
+from typing import Any, Literal
 from enum import Enum
 
 class Company(SQLModel, table=True):
@@ -18,6 +19,8 @@ class ChatRole(str, Enum):
 
 class ChatMessage(SQLModel, table=True):
     __tablename__ = "rag_chat_history"
+    # serves "latest N messages of a session" without a table scan
+    __table_args__ = (Index("ix_rag_chat_history_session_created", "session_id", "created_at"),)
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     session_id: UUID
     company_id: str
@@ -31,9 +34,103 @@ class RAGResponse(BaseModel):
     confidence: float
     sources: list[str]
     refusal: bool
+    # served from the semantic answer cache, no LLM call was made
+    cached: bool = False
+
+
+class IngestCounts(BaseModel):
+    files: int = 0
+    chunks: int = 0
+
+
+class IngestFailure(BaseModel):
+    source: str
+    error: str
+
+
+class IngestResult(BaseModel):
+    company_id: str
+    added: IngestCounts = Field(default_factory=IngestCounts)
+    updated: IngestCounts = Field(default_factory=IngestCounts)
+    removed: IngestCounts = Field(default_factory=IngestCounts)
+    skipped: IngestCounts = Field(default_factory=IngestCounts)
+    # files that could not be parsed; whatever was indexed for them before is kept
+    failed: list[IngestFailure] = Field(default_factory=list)
+    # files whose extension has no loader; ignored, not counted as failures
+    unsupported: list[str] = Field(default_factory=list)
+
+    @property
+    def chunks_embedded(self) -> int:
+        return self.added.chunks + self.updated.chunks
 
 
 class ChatRequest(BaseModel):
     query: str
     company_id: str = "acme-corp"
-    session_id: UUID | None = None
\ No newline at end of file
+    session_id: UUID | None = None
+    # second "make it conversational" pass; None means the endpoint default (on for /chat, off for /chat/stream)
+    refine: bool | None = None
+
+
+class IngestJobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class IngestJob(SQLModel, table=True):
+    __tablename__ = "rag_ingest_jobs"
+    # at most one queued or running job per company, across every worker process
+    __table_args__ = (
+        Index(
+            "ux_rag_ingest_jobs_active_company",
+            "company_id",
+            unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"),
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    company_id: str = Field(index=True)
+    docs_path: str
+    status: IngestJobStatus = IngestJobStatus.queued
+    files_total: int = 0
+    files_processed: int = 0
+    chunks_embedded: int = 0
+    errors: list[str] = Field(default_factory=list, sa_column=Column(JSON))
+    result: dict | None = Field(default=None, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    owner: str | None = None
+    heartbeat_at: datetime | None = None
+    cancel_requested: bool = False
+
+
+class IngestProgress(BaseModel):
+    """Live counters of one ingest run; setting `cancel_requested` stops it at the next file."""
+    files_total: int = 0
+    files_processed: int = 0
+    chunks_embedded: int = 0
+    errors: list[str] = Field(default_factory=list)
+    cancel_requested: bool = False
+
+
+class IngestJobRead(BaseModel):
+    job_id: UUID
+    company_id: str
+    status: IngestJobStatus
+    files_total: int
+    files_processed: int
+    chunks_embedded: int
+    errors: list[str]
+    result: dict[str, Any] | None = None
+    cancel_requested: bool = False
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    elapsed_seconds: float | None = None
+    files_per_second: float | None = None
+    chunks_per_second: float | None = None
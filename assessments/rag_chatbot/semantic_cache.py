@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from assessments.rag_chatbot.schemas import RAGResponse
+from core.config import settings
+import numpy as np
+import threading
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    refine: bool
+    generation: str | None
+    response: RAGResponse
+    created_at: float
+
+
+class SemanticCache:
+    """Per-company cache of answered queries, matched by cosine similarity of the query embedding.
+
+    Answers with and without the refine pass are phrased differently, so a lookup only matches entries
+    stored with the same `refine`. Entries also carry the index generation they were retrieved from; a
+    lookup against another generation (e.g. one another worker published) drops them as stale.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._companies: dict[str, OrderedDict[int, _Entry]] = {}
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, company_id: str, vector, refine: bool, generation: str | None) -> tuple[RAGResponse, float] | None:
+        query = self._normalize(vector)
+        with self._lock:
+            entries = self._companies.get(company_id)
+            if entries:
+                self._expire(entries, generation)
+            keys = [key for key, entry in (entries or {}).items() if entry.refine == refine]
+            if not keys:
+                self._stats["misses"] += 1
+                return None
+
+            similarities = np.stack([entries[k].vector for k in keys]) @ query
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            entries.move_to_end(keys[best])
+            self._stats["hits"] += 1
+            return entries[keys[best]].response.model_copy(update={"cached": True}), similarity
+
+    def store(self, company_id: str, vector, refine: bool, generation: str | None, response: RAGResponse):
+        with self._lock:
+            entries = self._companies.setdefault(company_id, OrderedDict())
+            entries[self._next_key] = _Entry(
+                self._normalize(vector), refine, generation, response.model_copy(), time.monotonic()
+            )
+            self._next_key += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, company_id: str):
+        with self._lock:
+            dropped = len(self._companies.pop(company_id, {}))
+            self._stats["invalidations"] += 1
+        logger.info("semantic_cache_invalidated", company_id=company_id, entries=dropped)
+
+    def _expire(self, entries: OrderedDict[int, _Entry], generation: str | None):
+        cutoff = time.monotonic() - self.ttl_seconds
+        for key in [k for k, e in entries.items() if e.created_at < cutoff or e.generation != generation]:
+            del entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": sum(len(e) for e in self._companies.values())}
+
+
+semantic_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    ttl_seconds=settings.semantic_cache_ttl_seconds,
+    max_entries=settings.semantic_cache_max_entries,
+)
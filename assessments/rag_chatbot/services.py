@@ -1,28 +1,48 @@
+from langchain_core.documents import Document
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import DirectoryLoader, TextLoader, PyPDFLoader
-from core.llm_client import LLMClient
+from core.llm_client import llm_client
 from core.vector_store import VectorStoreManager
 from core.embedding_client import embedding_client
+from core.query_batcher import query_embedder
+from core.ingest_manifest import content_hash
+from core.metrics import STAGE_LATENCY, record_cache, register_stats, timed
+from core.exceptions import IngestCancelledError
 from core.logger import logger
-from assessments.rag_chatbot.schemas import RAGResponse, ChatMessage
+from assessments.rag_chatbot.schemas import RAGResponse, ChatMessage, ChatRole, IngestFailure, IngestResult, IngestProgress
+from assessments.rag_chatbot.history import chat_history_cache
+from assessments.rag_chatbot.pipeline import EmbeddingPipeline
+from assessments.rag_chatbot.loaders import parse_files, supported
+from assessments.rag_chatbot.prompt_builder import PromptBuilder
+from assessments.rag_chatbot.semantic_cache import semantic_cache
 from core.config import settings
 from core.database import AsyncSessionLocal
+from core.write_behind import persist
 from sqlmodel import select
 import structlog
+from typing import AsyncIterator
 from uuid import uuid4, UUID
+import asyncio
+import glob
 import os
+import time
 
 # base of repository - two levels up from this file
 _PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
-llm_client = LLMClient()
 logger = structlog.get_logger()
+register_stats("semantic_cache", semantic_cache.stats)
+register_stats("chat_history_cache", chat_history_cache.stats)
+# cached answers may cite chunks that changed or disappeared in the new generation
+VectorStoreManager.on_generation_change(semantic_cache.invalidate)
+
+REFUSAL_ANSWER = "I don't have information about that in our company documents."
 
 class RAGService:
-    THRESHOLD = 0.45
     CHUNK_SIZE = 800
     CHUNK_OVERLAP = 120
 
+    # low-relevance refusals answered without the LLM, and a running average of what the LLM would have cost
+    _relevance_stats = {"short_circuits": 0, "answered": 0, "llm_ms_avg": 0.0, "saved_ms_total": 0.0}
+
     PROMPT = """You are a **friendly, helpful assistant** for {company_name}.
 Speak in a polite, conversational tone as if talking to a customer or
 colleague.  The user's question may contain grammatical errors; interpret the
@@ -41,17 +61,12 @@ Previous conversation:
 {chat_history}"""
 
     @staticmethod
-    async def ingest_documents(company_id: str, docs_path: str = "data/uploads/02_rag/company_docs"):
-        # wipe existing index so we rebuild from current documents
-        index_path = settings.faiss_index_path
-        try:
-            if os.path.exists(f"{index_path}.faiss"):
-                os.remove(f"{index_path}.faiss")
-                VectorStoreManager._vectorstore = None
-                logger.info("faiss_index_reset", path=index_path)
-        except Exception as e:
-            logger.warning("faiss_reset_failed", error=str(e))
-
+    async def ingest_documents(
+        company_id: str,
+        docs_path: str = "data/uploads/02_rag/company_docs",
+        progress: IngestProgress | None = None,
+    ) -> IngestResult:
+        progress = progress or IngestProgress()
         # normalize a relative path against project root and ensure it exists
         if not os.path.isabs(docs_path):
             docs_path = os.path.join(_PROJECT_ROOT, docs_path)
@@ -73,66 +88,271 @@ Previous conversation:
                 )
             logger.info("created_sample_doc", path=sample_file)
 
-        vectorstore = VectorStoreManager.get_vectorstore()
-        splitter = RecursiveCharacterTextSplitter(chunk_size=RAGService.CHUNK_SIZE, chunk_overlap=RAGService.CHUNK_OVERLAP)
+        # a private copy of the live generation: chats keep searching the live one until publish swaps it
+        vectorstore, manifest = await asyncio.to_thread(VectorStoreManager.checkout, company_id)
+
+        # vectors the manifest points at may be gone (e.g. index recreated), so only trust ids that still exist
+        # reads every chunk id from the docstore, so it runs off the event loop like the checkout
+        live_ids = await asyncio.to_thread(lambda: set(vectorstore.index_to_docstore_id.values()))
+        previous = dict(manifest.files(company_id))
+        result = IngestResult(company_id=company_id)
+        pipeline = EmbeddingPipeline(vectorstore)
+        stale_ids = []
+        paths = [p for p in sorted(glob.glob(os.path.join(docs_path, "**", "*.*"), recursive=True)) if os.path.isfile(p)]
+        progress.files_total = len(paths)
+        to_parse: dict[str, tuple[str, str, dict | None, dict]] = {}
+        workers = settings.ingest_parse_workers or os.cpu_count() or 1
+
+        def check_cancelled():
+            if progress.cancel_requested:
+                raise IngestCancelledError(f"Ingest for {company_id} cancelled after {progress.files_processed} files")
+
+        def record_failure(source_key: str, error: str):
+            logger.warning("ingest_file_failed", company_id=company_id, source=source_key, error=error)
+            result.failed.append(IngestFailure(source=source_key, error=error))
+            progress.errors.append(f"{source_key}: {error}")
+            progress.files_processed += 1
+
+        try:
+            for path in paths:
+                check_cancelled()
+                source_key = os.path.relpath(path, docs_path)
+                # popped even when the file fails below: a file that breaks keeps its manifest entry and vectors
+                entry = previous.pop(source_key, None)
+                if not supported(path):
+                    logger.info("ingest_file_unsupported", company_id=company_id, source=source_key)
+                    result.unsupported.append(source_key)
+                    progress.files_processed += 1
+                    continue
+                # hashing reads the whole file, so it runs off the event loop
+                file_hash = await asyncio.to_thread(RAGService._hash_file, path)
+
+                known_chunks = {}
+                if entry:
+                    known_chunks = {h: vid for h, vid in entry["chunks"].items() if vid in live_ids}
+                    if entry["hash"] == file_hash and len(known_chunks) == len(entry["chunks"]):
+                        result.skipped.files += 1
+                        result.skipped.chunks += len(known_chunks)
+                        progress.files_processed += 1
+                        continue
+                to_parse[path] = (source_key, file_hash, entry, known_chunks)
+
+            # parsing and splitting are CPU bound, so they run in worker processes; chunks reach the
+            # embedding pipeline file by file, in whatever order the workers finish
+            async for path, parsed, seconds in parse_files(
+                list(to_parse), company_id, RAGService.CHUNK_SIZE, RAGService.CHUNK_OVERLAP, workers
+            ):
+                check_cancelled()
+                source_key, file_hash, entry, known_chunks = to_parse[path]
+                if isinstance(parsed, Exception):
+                    record_failure(source_key, str(parsed) or type(parsed).__name__)
+                    continue
+                STAGE_LATENCY.labels("ingest", "load_and_split").observe(seconds)
+
+                chunks, embedded = {}, 0
+                for chunk in parsed:
+                    chunk_hash = content_hash(chunk.page_content)
+                    if chunk_hash in chunks:
+                        continue
+                    vector_id = known_chunks.get(chunk_hash) or content_hash(f"{company_id}:{source_key}:{chunk_hash}")[:32]
+                    chunks[chunk_hash] = vector_id
+                    if vector_id not in live_ids:
+                        await pipeline.add(chunk, vector_id)
+                        embedded += 1
+
+                stale_ids.extend(vid for h, vid in known_chunks.items() if h not in chunks)
+                counts = result.updated if entry else result.added
+                counts.files += 1
+                counts.chunks += embedded
+                manifest.set_file(company_id, source_key, file_hash, chunks)
+                progress.files_processed += 1
+                progress.chunks_embedded = pipeline.embedded
+
+            await pipeline.flush()
+            progress.chunks_embedded = pipeline.embedded
+        except BaseException:
+            # the working copy is simply dropped; the live generation was never touched
+            await pipeline.aclose()
+            raise
 
-        loader = DirectoryLoader(
-            docs_path,
-            glob="**/*.*",
-            loader_cls=PyPDFLoader if docs_path.endswith(".pdf") else TextLoader,
-            show_progress=True,
+        # whatever is left in `previous` no longer exists on disk
+        for source_key, entry in previous.items():
+            removed_ids = [vid for vid in entry["chunks"].values() if vid in live_ids]
+            stale_ids.extend(removed_ids)
+            result.removed.files += 1
+            result.removed.chunks += len(removed_ids)
+            manifest.remove_file(company_id, source_key)
+
+        if stale_ids:
+            # IVF and HNSW indexes are rebuilt to delete, which must not stall requests on the event loop
+            await asyncio.to_thread(VectorStoreManager.delete_vectors, vectorstore, stale_ids)
+        generation = None
+        if stale_ids or pipeline.embedded or result.added.files or result.updated.files or result.removed.files:
+            await asyncio.to_thread(VectorStoreManager.ensure_index_type, vectorstore)
+            generation = await asyncio.to_thread(VectorStoreManager.publish, company_id, vectorstore, manifest)
+
+        logger.info(
+            "documents_ingested",
+            company_id=company_id,
+            generation=generation,
+            chunks_embedded=result.chunks_embedded,
+            chunks_deleted=len(stale_ids),
+            batches=pipeline.batches,
+            parse_workers=workers,
+            embedding_cache=embedding_client.cache_stats(),
+            **result.model_dump(exclude={"company_id"}),
         )
-        docs = loader.load()
+        return result
 
-        for doc in docs:
-            doc.metadata["company_id"] = company_id
-            doc.metadata["source"] = doc.metadata.get("source", "unknown")
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        with open(path, "rb") as f:
+            return content_hash(f.read())
 
-        chunks = splitter.split_documents(docs)
-        if not chunks:
-            logger.warning("no_documents_to_ingest", path=docs_path)
-            return 0
-        vectorstore.add_documents(chunks)
-        VectorStoreManager.save()
+    @staticmethod
+    async def _embed_query(query: str) -> list[float]:
+        # embedded once per request and shared by the semantic cache and the vector search;
+        # concurrent requests are coalesced into one embeddings call
+        with timed("rag", "embed_query"):
+            return await query_embedder.embed(query)
 
-        logger.info("documents_ingested", company_id=company_id, chunks=len(chunks))
-        return len(chunks)
+    @staticmethod
+    async def _retrieve(company_id: str, query_vector: list[float]) -> list[tuple[Document, float]]:
+        # the shard only holds this company's vectors, so no post-hoc metadata filter is needed
+        vectorstore = VectorStoreManager.get_vectorstore(company_id)
+        with timed("rag", "retrieval"):
+            results = await vectorstore.asimilarity_search_with_score_by_vector(query_vector, k=6)
+        # embeddings are unit length, so the squared L2 distance d maps to cosine similarity 1 - d/2
+        return [(doc, min(max(1 - float(distance) / 2, 0.0), 1.0)) for doc, distance in results]
+
+    @staticmethod
+    def threshold_for(company_id: str) -> float:
+        return settings.rag_company_thresholds.get(company_id, settings.rag_score_threshold)
 
     @staticmethod
-    async def chat(company_id: str, query: str, session_id: UUID) -> RAGResponse:
-        vectorstore = VectorStoreManager.get_vectorstore()
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 6, "filter": {"company_id": company_id}}
+    def _is_relevant(company_id: str, best_score: float) -> bool:
+        threshold = RAGService.threshold_for(company_id)
+        stats = RAGService._relevance_stats
+        if best_score >= threshold:
+            stats["answered"] += 1
+            return True
+        stats["short_circuits"] += 1
+        stats["saved_ms_total"] += stats["llm_ms_avg"]
+        logger.info(
+            "rag_low_relevance_refusal",
+            company_id=company_id,
+            best_score=round(best_score, 3),
+            threshold=threshold,
+            short_circuits=stats["short_circuits"],
+            short_circuit_rate=round(stats["short_circuits"] / (stats["short_circuits"] + stats["answered"]), 4),
+            est_saved_ms=round(stats["llm_ms_avg"], 1),
+            est_saved_ms_total=round(stats["saved_ms_total"], 1),
         )
+        return False
 
-        docs = await retriever.ainvoke(query)
-        max_score = max((doc.metadata.get("score", 0) for doc in docs), default=0) if docs else 0
-        confidence = round(max_score, 3)
+    @staticmethod
+    def _record_llm_ms(elapsed_ms: float):
+        stats = RAGService._relevance_stats
+        stats["llm_ms_avg"] = elapsed_ms if not stats["llm_ms_avg"] else 0.9 * stats["llm_ms_avg"] + 0.1 * elapsed_ms
 
-        if not docs:
-            return RAGResponse(answer="I don't have information about that in our company documents.", confidence=0, sources=[], refusal=True)
+    @staticmethod
+    def _cached_answer(
+        company_id: str, query_vector: list[float], refine: bool, history: list[tuple[str, str]], generation: str | None
+    ) -> RAGResponse | None:
+        # a follow-up is answered in light of the conversation so far, so only opening questions are cached
+        if not settings.semantic_cache_enabled or history:
+            return None
+        with timed("rag", "semantic_cache"):
+            hit = semantic_cache.lookup(company_id, query_vector, refine, generation)
+        record_cache("semantic", "miss" if hit is None else "hit")
+        if hit is None:
+            return None
+        response, similarity = hit
+        logger.info("semantic_cache_hit", company_id=company_id, similarity=round(similarity, 4))
+        return response
 
-        context = "\n\n".join([doc.page_content for doc in docs])
-        sources = list({doc.metadata.get("source", "unknown") for doc in docs})
+    @staticmethod
+    def _remember_answer(
+        company_id: str,
+        query_vector: list[float],
+        refine: bool,
+        history: list[tuple[str, str]],
+        generation: str | None,
+        response: RAGResponse,
+    ):
+        if not settings.semantic_cache_enabled or history:
+            return
+        # `generation` was read before retrieval; if an ingest went live since, the answer may come from
+        # the old index, and the invalidation it triggered has already run
+        if VectorStoreManager.current_generation(company_id) != generation:
+            logger.info("semantic_cache_store_skipped", company_id=company_id, generation=generation)
+            return
+        semantic_cache.store(company_id, query_vector, refine, generation, response)
 
-        # Simple memory (last 6 messages)
-        async with AsyncSessionLocal() as session:
-            result = await session.execute(
-                select(ChatMessage)
-                .where(ChatMessage.session_id == session_id)
-                .order_by(ChatMessage.created_at.desc())
-                .limit(6)
+    @staticmethod
+    async def _load_history(session_id: UUID) -> list[tuple[str, str]]:
+        # Simple memory (last N messages), served from the in-process ring buffer when the session is hot
+        history = chat_history_cache.get(session_id)
+        record_cache("chat_history", "miss" if history is None else "hit")
+        if history is None:
+            with timed("rag", "history_query"):
+                async with AsyncSessionLocal() as session:
+                    result = await session.execute(
+                        select(ChatMessage)
+                        .where(ChatMessage.session_id == session_id)
+                        .order_by(ChatMessage.created_at.desc())
+                        .limit(settings.chat_history_messages)
+                    )
+                    history = [(ChatRole(msg.role).value, msg.content) for msg in result.scalars().all()[::-1]]
+            chat_history_cache.fill(session_id, history)
+        return list(history)
+
+    @staticmethod
+    def _build_messages(company_id: str, query: str, results: list[tuple[Document, float]], history: list[tuple[str, str]]) -> tuple[list, list[Document]]:
+        full_prompt, docs = PromptBuilder(RAGService.PROMPT).build(query, results, history, company_name=company_id)
+        return [SystemMessage(content=full_prompt), HumanMessage(content=query)], docs
+
+    @staticmethod
+    def _refine_messages(answer: str) -> list:
+        refine_prompt = (
+            "Please rewrite the following response to be warm and conversational,"
+            " while still staying truthful and grounded in the provided context:\n\n" + answer
+        )
+        return [SystemMessage(content=refine_prompt), HumanMessage(content="")]
+
+    @staticmethod
+    async def _save_turn(company_id: str, session_id: UUID, query: str, answer: str, confidence: float):
+        with timed("rag", "save_turn"):
+            await persist(
+                ChatMessage(session_id=session_id, company_id=company_id, role="user", content=query),
+                ChatMessage(session_id=session_id, company_id=company_id, role="assistant", content=answer, confidence=confidence),
             )
-            history = result.scalars().all()[::-1]
-            chat_history = "\n".join([f"{msg.role}: {msg.content}" for msg in history])
+        chat_history_cache.append(session_id, [(ChatRole.user.value, query), (ChatRole.assistant.value, answer)])
 
-        full_prompt = RAGService.PROMPT.format(company_name=company_id, context=context, chat_history=chat_history or "No previous messages.")
-        
-        response = await llm_client.llm.ainvoke([
-            SystemMessage(content=full_prompt),
-            HumanMessage(content=query)
-        ])
+    @staticmethod
+    async def chat(company_id: str, query: str, session_id: UUID, refine: bool = True) -> RAGResponse:
+        query_vector = await RAGService._embed_query(query)
+        history = await RAGService._load_history(session_id)
+        # read from CURRENT rather than the loaded shard, so a generation another worker published counts
+        generation = VectorStoreManager.current_generation(company_id)
+        cached = RAGService._cached_answer(company_id, query_vector, refine, history, generation)
+        if cached is not None:
+            await RAGService._save_turn(company_id, session_id, query, cached.answer, cached.confidence)
+            return cached
+
+        results = await RAGService._retrieve(company_id, query_vector)
+        confidence = round(max((score for _, score in results), default=0.0), 3)
+        if not RAGService._is_relevant(company_id, confidence):
+            await RAGService._save_turn(company_id, session_id, query, REFUSAL_ANSWER, confidence)
+            return RAGResponse(answer=REFUSAL_ANSWER, confidence=confidence, sources=[], refusal=True)
+
+        messages, docs = RAGService._build_messages(company_id, query, results, history)
+        context = "\n\n".join([doc.page_content for doc in docs])
+        sources = list({doc.metadata.get("source", "unknown") for doc in docs})
+
+        llm_started = time.perf_counter()
+        with timed("rag", "generation"):
+            response = await llm_client.invoke(messages)
 
         answer = response.content.strip()
 
@@ -148,25 +368,97 @@ Previous conversation:
 
         # ensure the final answer is phrased in friendly, conversational style
         # (the prompt already encourages this, but a second pass can help)
-        if answer and not answer.lower().startswith("i don't have information"):
-            refine_prompt = (
-                "Please rewrite the following response to be warm and conversational,"
-                " while still staying truthful and grounded in the provided context:\n\n" + answer
-            )
-            refined = await llm_client.llm.ainvoke([
-                SystemMessage(content=refine_prompt),
-                HumanMessage(content="")
-            ])
+        if refine and answer and not answer.lower().startswith("i don't have information"):
+            with timed("rag", "refine"):
+                refined = await llm_client.invoke(RAGService._refine_messages(answer))
             answer = refined.content.strip()
+        RAGService._record_llm_ms((time.perf_counter() - llm_started) * 1000)
         # Save to history
-        async with AsyncSessionLocal() as session:
-            session.add(ChatMessage(session_id=session_id, company_id=company_id, role="user", content=query))
-            session.add(ChatMessage(session_id=session_id, company_id=company_id, role="assistant", content=answer, confidence=confidence))
-            await session.commit()
+        await RAGService._save_turn(company_id, session_id, query, answer, confidence)
 
-        return RAGResponse(
+        response = RAGResponse(
             answer=answer,
             confidence=confidence,
             sources=sources,
             refusal="don't have information" in answer.lower()
-        )
\ No newline at end of file
+        )
+        RAGService._remember_answer(company_id, query_vector, refine, history, generation, response)
+        return response
+
+    @staticmethod
+    async def chat_stream(company_id: str, query: str, session_id: UUID, refine: bool = False) -> AsyncIterator[tuple[str, dict]]:
+        """Yield ``(event, payload)`` pairs: one ``retrieval``, many ``token`` and a final ``done``.
+
+        Without ``refine`` the single streamed generation is the answer (the prompt already asks for a
+        friendly tone); with it, the draft is generated silently and the rewrite is what gets streamed.
+        """
+        started = time.perf_counter()
+        query_vector = await RAGService._embed_query(query)
+        history = await RAGService._load_history(session_id)
+        # read from CURRENT rather than the loaded shard, so a generation another worker published counts
+        generation = VectorStoreManager.current_generation(company_id)
+        cached = RAGService._cached_answer(company_id, query_vector, refine, history, generation)
+        if cached is not None:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield "retrieval", {"sources": cached.sources, "confidence": cached.confidence, "retrieval_ms": elapsed_ms, "cached": True}
+            yield "token", {"text": cached.answer}
+            await RAGService._save_turn(company_id, session_id, query, cached.answer, cached.confidence)
+            yield "done", {**cached.model_dump(), "ttft_ms": elapsed_ms, "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+            return
+
+        results = await RAGService._retrieve(company_id, query_vector)
+        confidence = round(max((score for _, score in results), default=0.0), 3)
+        relevant = RAGService._is_relevant(company_id, confidence)
+        messages, docs = [], []
+        if relevant:
+            messages, docs = RAGService._build_messages(company_id, query, results, history)
+        sources = list({doc.metadata.get("source", "unknown") for doc in docs})
+        yield "retrieval", {
+            "sources": sources,
+            "confidence": confidence,
+            "retrieval_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cached": False,
+        }
+
+        ttft_ms = None
+        parts = []
+        if not docs:
+            parts.append(REFUSAL_ANSWER)
+            ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+            yield "token", {"text": REFUSAL_ANSWER}
+        else:
+            llm_started = time.perf_counter()
+            draft = None
+            if refine:
+                with timed("rag", "generation"):
+                    draft = (await llm_client.invoke(messages)).content.strip()
+            if draft is not None and (not draft or draft.lower().startswith("i don't have information")):
+                # nothing to rewrite: the draft is the answer, sent as-is rather than generated a second time
+                ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(draft)
+                yield "token", {"text": draft}
+            else:
+                if draft is not None:
+                    messages = RAGService._refine_messages(draft)
+                async for chunk in llm_client.stream(messages):
+                    if not chunk.content:
+                        continue
+                    if ttft_ms is None:
+                        ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    parts.append(chunk.content)
+                    yield "token", {"text": chunk.content}
+            RAGService._record_llm_ms((time.perf_counter() - llm_started) * 1000)
+
+        answer = "".join(parts).strip()
+        await RAGService._save_turn(company_id, session_id, query, answer, confidence)
+        response = RAGResponse(
+            answer=answer,
+            confidence=confidence,
+            sources=sources,
+            refusal="don't have information" in answer.lower(),
+        )
+        if docs:
+            RAGService._remember_answer(company_id, query_vector, refine, history, generation, response)
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("rag_chat_streamed", company_id=company_id, ttft_ms=ttft_ms, total_ms=total_ms, refine=refine)
+        yield "done", {**response.model_dump(), "ttft_ms": ttft_ms, "total_ms": total_ms}
@@ -0,0 +1,86 @@
+from core.llm_client import track_calls
+from core.metrics import STAGE_LATENCY
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+import asyncio
+import time
+
+@dataclass(frozen=True)
+class Step:
+    name: str
+    run: Callable[[dict], Awaitable[Any]]
+    depends_on: tuple[str, ...] = ()
+
+class StepExecutor:
+    """Runs a small DAG of async steps, starting each one as soon as its dependencies finish.
+
+    Every step receives the shared context dict; its return value is stored
+    under ``context[step.name]`` for the steps that depend on it.
+    """
+
+    def __init__(self, steps: list[Step]):
+        self.steps = {step.name: step for step in steps}
+        for step in steps:
+            unknown = set(step.depends_on) - self.steps.keys()
+            if unknown:
+                raise ValueError(f"step {step.name!r} depends on unknown steps {sorted(unknown)}")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name: str):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"dependency cycle through step {name!r}")
+            visiting.add(name)
+            for dep in self.steps[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    async def run(self, context: dict) -> dict:
+        """Execute all steps and return the per-step trace; raises the first step failure."""
+        trace: dict[str, dict] = {}
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_step(step: Step):
+            if step.depends_on:
+                await asyncio.gather(*(tasks[dep] for dep in step.depends_on))
+            started_at = datetime.now(timezone.utc)
+            started = time.perf_counter()
+            status = "cancelled"
+            with track_calls() as stats:
+                try:
+                    context[step.name] = await step.run(context)
+                    status = "ok"
+                except Exception:
+                    status = "failed"
+                    raise
+                finally:
+                    elapsed = time.perf_counter() - started
+                    STAGE_LATENCY.labels("workflow", step.name).observe(elapsed)
+                    trace[step.name] = {
+                        "started_at": started_at.isoformat(),
+                        "duration_ms": round(elapsed * 1000, 1),
+                        "status": status,
+                        "retries": stats.retries,
+                        "llm_calls": stats.calls,
+                        "tokens": stats.tokens,
+                    }
+
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.create_task(run_step(step), name=f"step:{step.name}")
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: trace[name] for name in self.steps if name in trace}
@@ -0,0 +1,142 @@
+from assessments.workflow_automation.schemas import LeadFields
+from functools import lru_cache
+from pydantic import BaseModel, ValidationError, create_model
+import re
+
+# raw lead keys (lower-cased, spaces/dashes as underscores) that map straight onto LeadFields
+FIELD_ALIASES = {
+    "name": ("name", "full_name", "fullname", "contact_name", "customer_name", "lead_name"),
+    "email": ("email", "email_address", "e_mail", "mail", "contact_email", "work_email"),
+    "company": ("company", "company_name", "organization", "organisation", "org", "business", "employer"),
+    "phone": ("phone", "phone_number", "telephone", "tel", "mobile", "cell", "contact_number"),
+    "budget": ("budget", "budget_usd", "estimated_budget", "deal_size", "amount"),
+    "message_summary": ("message_summary", "summary", "subject"),
+}
+MESSAGE_KEYS = ("message", "body", "text", "notes", "description", "inquiry", "enquiry", "comments")
+MAX_SUMMARY_CHARS = 200
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+BUDGET_RE = re.compile(r"(?:budget[^\d$€£]{0,20}|[$€£]\s*)(\d[\d,]*(?:\.\d+)?)\s*(k|m|thousand|million)?\b", re.IGNORECASE)
+MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "m": 1e6, "million": 1e6}
+
+
+def _normalize_key(key) -> str:
+    return re.sub(r"[\s-]+", "_", str(key).strip().lower())
+
+
+def parse_email(value) -> str | None:
+    match = EMAIL_RE.search(str(value))
+    if not match:
+        return None
+    # only the domain is case-insensitive; the local part is kept as written
+    local, domain = match.group(0).rsplit("@", 1)
+    return f"{local}@{domain.lower()}"
+
+
+def parse_phone(value, min_digits: int = 7) -> str | None:
+    match = PHONE_RE.search(str(value))
+    if not match:
+        return None
+    digits = re.sub(r"\D", "", match.group(0))
+    if not min_digits <= len(digits) <= 15:
+        return None
+    return ("+" if match.group(0).startswith("+") else "") + digits
+
+
+def parse_budget(value) -> float | None:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if value >= 0 else None
+    text = str(value).strip()
+    # a bare field value like "5k" or "10,000" needs no currency marker
+    match = re.fullmatch(r"[$€£]?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m|thousand|million)?\s*(?:usd|eur|gbp)?", text, re.IGNORECASE)
+    match = match or BUDGET_RE.search(text)
+    if not match:
+        return None
+    amount = float(match.group(1).replace(",", ""))
+    return amount * MULTIPLIERS.get((match.group(2) or "").lower(), 1)
+
+
+PARSERS = {"email": parse_email, "phone": parse_phone, "budget": parse_budget}
+# free text is full of numbers (dates, order ids), so only unambiguous matches count there
+TEXT_PARSERS = {
+    "email": parse_email,
+    "phone": lambda text: parse_phone(text, min_digits=10),
+    "budget": lambda text: (m := BUDGET_RE.search(text)) and parse_budget(m.group(0)),
+}
+
+
+def _clean_text(value) -> str | None:
+    text = " ".join(str(value).split()) if value is not None else ""
+    return text or None
+
+
+def truncate_summary(message: str) -> str:
+    """The message itself if short enough, else cut at the last sentence end (or word break) that fits."""
+    if len(message) <= MAX_SUMMARY_CHARS:
+        return message
+    # one char past the limit, so a sentence ending exactly at the limit still counts
+    head = message[:MAX_SUMMARY_CHARS + 1]
+    ends = [m.end() for m in re.finditer(r"[.!?](?=\s)", head)]
+    if ends and ends[-1] >= MAX_SUMMARY_CHARS // 2:
+        return head[:ends[-1]]
+    cut = head[:MAX_SUMMARY_CHARS - 1].rsplit(" ", 1)[0]
+    return cut.rstrip(" ,;:-") + "…"
+
+
+def extract_fields(raw_lead: dict) -> LeadFields:
+    """Fill what can be read deterministically from the lead: aliased keys first, then patterns in free text."""
+    values = {_normalize_key(k): v for k, v in raw_lead.items() if v not in (None, "")}
+    found = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias not in values:
+                continue
+            value = PARSERS.get(field, _clean_text)(values[alias])
+            if value is not None:
+                found[field] = value
+                break
+    if "first_name" in values and "name" not in found:
+        found["name"] = _clean_text(f"{values['first_name']} {values.get('last_name', '')}")
+
+    message = next((_clean_text(values[k]) for k in MESSAGE_KEYS if k in values), None)
+    if message:
+        for field, parse in TEXT_PARSERS.items():
+            if field not in found and (value := parse(message)) is not None:
+                found[field] = value
+        if "message_summary" not in found:
+            found["message_summary"] = truncate_summary(message)
+
+    return _validated(found)
+
+
+def _validated(found: dict) -> LeadFields:
+    # anything LeadFields rejects is dropped rather than failing the lead
+    fields = {}
+    for field, value in found.items():
+        try:
+            LeadFields(**{field: value})
+        except ValidationError:
+            continue
+        fields[field] = value
+    return LeadFields(**fields)
+
+
+def merge_fields(fields: LeadFields, extra: dict) -> LeadFields:
+    """Add LLM-extracted values for fields the rules left empty; rule values always win."""
+    return _validated({**extra, **fields.model_dump(exclude_none=True)})
+
+
+def missing_fields(fields: LeadFields, required: list[str]) -> list[str]:
+    return [name for name in required if getattr(fields, name) in (None, "")]
+
+
+@lru_cache(maxsize=64)
+def partial_schema(field_names: tuple[str, ...]) -> type[BaseModel]:
+    """A LeadFields subset for asking the LLM only for what the rules could not find."""
+    return create_model(
+        "LeadFieldsMissing",
+        **{name: (LeadFields.model_fields[name].annotation, None) for name in field_names},
+    )
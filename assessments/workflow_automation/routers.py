@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request
 from assessments.workflow_automation.services import WorkflowService
 from assessments.workflow_automation.schemas import WorkflowResponse
-from core.exceptions import AppBaseException
-from fastapi.responses import JSONResponse
+from core.exceptions import AppBaseException, ValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+import json
 
 router = APIRouter(prefix="/api/01-workflow", tags=["Assessment 1"])
 
@@ -11,7 +12,64 @@ async def process_lead(raw_lead: dict):
     try:
         return await WorkflowService.process_lead(raw_lead)
     except AppBaseException as e:
+        retry_after = getattr(e, "retry_after", None)
         return JSONResponse(
             status_code=e.status_code,
-            content={"error": e.code, "detail": str(e)}
-        )
\ No newline at end of file
+            content={"error": e.code, "detail": str(e)},
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
+        )
+
+def _parse_ndjson(text: str) -> list:
+    leads = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            leads.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            # reported as a failed lead, the rest of the upload still runs
+            leads.append(ValueError(f"line {line_no}: invalid JSON ({e.msg})"))
+    return leads
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise ValidationError(f"Expected a JSON array of leads or NDJSON in UTF-8 (invalid byte at position {e.start})")
+
+def _parse_leads(text: str, ndjson: bool) -> list:
+    if ndjson:
+        return _parse_ndjson(text)
+    try:
+        leads = json.loads(text)
+    except json.JSONDecodeError:
+        # an uploaded file without a helpful content type may still be NDJSON
+        return _parse_ndjson(text)
+    if not isinstance(leads, list):
+        raise ValidationError("Expected a JSON array of leads or NDJSON")
+    return leads
+
+@router.post("/leads/batch")
+async def process_lead_batch(request: Request, concurrency: int | None = Query(None, ge=1)):
+    """Accepts a JSON array, an NDJSON body or a multipart upload (field `file`); streams NDJSON results."""
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise ValidationError("Multipart uploads must include a `file` field")
+            text = _decode(await upload.read())
+            ndjson = (upload.filename or "").endswith((".ndjson", ".jsonl"))
+        else:
+            text = _decode(await request.body())
+            ndjson = "ndjson" in content_type or "jsonl" in content_type
+        leads = _parse_leads(text, ndjson)
+    except AppBaseException as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.code, "detail": str(e)})
+
+    async def results():
+        async for result in WorkflowService.process_batch(leads, concurrency=concurrency):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,15 +1,24 @@
-from core.llm_client import LLMClient
+from langchain_core.messages import SystemMessage, HumanMessage
+from core.llm_client import llm_client
 from core.logger import logger
-from assessments.workflow_automation.schemas import IntentClassification, LeadFields, WorkflowLead, WorkflowResponse
-from core.exceptions import ValidationError, DatabaseError
+from assessments.workflow_automation.schemas import IntentClassification, LeadFields, WorkflowLead, WorkflowResponse, WorkflowStatus
+from assessments.workflow_automation.executor import Step, StepExecutor
+from assessments.workflow_automation.extractor import extract_fields, merge_fields, missing_fields, partial_schema
+from core.exceptions import ValidationError, DatabaseError, RateLimitedError
 from core.database import AsyncSessionLocal
+from core.write_behind import persist
+from core.config import settings
+from core.metrics import timed
+from core.rate_limiter import patient
+from sqlalchemy import insert
 from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import AsyncIterator, Iterable
+import asyncio
 import json
-import re
+import structlog
+import time
 from uuid import uuid4
 
-llm = LLMClient()
-
 class WorkflowService:
     INTENT_PROMPT = """You are a deterministic lead routing agent.
 Classify the lead into exactly one: sales, support, partnership, unknown.
@@ -21,66 +30,234 @@ Missing fields = null. Return ONLY valid JSON matching the schema."""
     RESPONSE_PROMPT = """You are a professional sales assistant.
 Use ONLY the extracted fields and intent. Write a natural, helpful reply (max 3 sentences)."""
 
+    # 1. Intent Classification
+    @staticmethod
+    async def _classify_intent(ctx: dict) -> IntentClassification:
+        intent_result: IntentClassification = await llm_client.structured_call(
+            WorkflowService.INTENT_PROMPT, json.dumps(ctx["raw_lead"]), IntentClassification
+        )
+        if intent_result.confidence < 0.7:
+            intent_result.intent = "unknown"
+        return intent_result
+
+    # 2. Field Extraction (independent of intent, so it runs concurrently with it)
+    @staticmethod
+    async def _extract_fields(ctx: dict) -> LeadFields:
+        # 3. Rules first: aliased keys plus email/phone/budget patterns; the LLM only fills required gaps
+        fields = extract_fields(ctx["raw_lead"])
+        missing = missing_fields(fields, settings.lead_required_fields)
+        ctx["extraction_path"] = "rules+llm" if missing else "rules"
+        ctx["llm_fields"] = missing
+        if not missing:
+            return fields
+        llm_result = await llm_client.structured_call(
+            WorkflowService.EXTRACTION_PROMPT, json.dumps(ctx["raw_lead"]), partial_schema(tuple(missing))
+        )
+        return merge_fields(fields, llm_result.model_dump(exclude_none=True))
+
+    # 4. Generate AI Response
+    @staticmethod
+    async def _generate_response(ctx: dict) -> str:
+        context = f"Intent: {ctx['intent'].intent}\nFields: {ctx['extraction'].model_dump_json()}"
+        ai_response = await llm_client.invoke([
+            SystemMessage(content=WorkflowService.RESPONSE_PROMPT),
+            HumanMessage(content=context)
+        ])
+        return ai_response.content
+
+    @staticmethod
+    def _build_lead(ctx: dict) -> WorkflowLead:
+        return WorkflowLead(
+            raw_input=ctx["raw_lead"],
+            intent=ctx["intent"].intent,
+            confidence=ctx["intent"].confidence,
+            extracted_fields=ctx["extraction"].model_dump(),
+            ai_response=ctx["response"],
+            status=WorkflowStatus.processed,
+            request_id=ctx["request_id"],
+        )
+
+    # 5. Save to DB - the session is only opened once every LLM call is done
+    @staticmethod
+    async def _persist(ctx: dict) -> WorkflowLead:
+        lead = WorkflowService._build_lead(ctx)
+        await persist(lead)
+        return lead
+
+    ANALYSIS_STEPS = [
+        Step("intent", _classify_intent),
+        Step("extraction", _extract_fields),
+        Step("response", _generate_response, depends_on=("intent", "extraction")),
+    ]
+    PIPELINE = StepExecutor([*ANALYSIS_STEPS, Step("persist", _persist, depends_on=("response",))])
+    # batch mode persists through bulk inserts instead of a per-lead commit
+    BATCH_PIPELINE = StepExecutor(ANALYSIS_STEPS)
+
     @staticmethod
     async def process_lead(raw_lead: dict) -> WorkflowResponse:
         request_id = str(uuid4())
         logger = structlog.get_logger().bind(request_id=request_id)
 
-        async with AsyncSessionLocal() as session:
+        ctx = {"raw_lead": raw_lead, "request_id": request_id}
+        started = time.perf_counter()
+        try:
+            steps = await WorkflowService.PIPELINE.run(ctx)
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            logger.error("lead_processing_failed", error=str(e), request_id=request_id)
+            raise DatabaseError("Failed to process lead") from e
+
+        lead: WorkflowLead = ctx["persist"]
+        logger.info("lead_processed", lead_id=str(lead.id), intent=lead.intent)
+
+        return WorkflowResponse(
+            lead_id=lead.id,
+            intent=lead.intent,
+            confidence=lead.confidence,
+            extracted_fields=LeadFields(**lead.extracted_fields),
+            ai_response=lead.ai_response or "",
+            status=lead.status,
+            execution_trace={
+                "intent_confidence": lead.confidence,
+                "request_id": request_id,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                "extraction_path": ctx["extraction_path"],
+                "llm_fields": ctx["llm_fields"],
+                "steps": steps,
+            }
+        )
+
+    @staticmethod
+    async def _analyze_for_batch(index: int, raw_lead) -> tuple[dict, WorkflowLead]:
+        request_id = str(uuid4())
+        if isinstance(raw_lead, Exception):
+            error = str(raw_lead)
+            raw_lead = {}
+        elif not isinstance(raw_lead, dict):
+            error = "lead must be a JSON object"
+            raw_lead = {"value": raw_lead}
+        else:
+            error = None
+
+        if error is None:
+            ctx = {"raw_lead": raw_lead, "request_id": request_id}
             try:
-                # 1. Intent Classification
-                intent_result: IntentClassification = await llm.structured_call(
-                    WorkflowService.INTENT_PROMPT, json.dumps(raw_lead), IntentClassification
-                )
-
-                if intent_result.confidence < 0.7:
-                    intent_result.intent = "unknown"
-
-                # 2. Field Extraction
-                extraction_result: LeadFields = await llm.structured_call(
-                    WorkflowService.EXTRACTION_PROMPT, json.dumps(raw_lead), LeadFields
-                )
-
-                # 3. Fallback regex if critical fields missing
-                if not extraction_result.email:
-                    email_match = re.search(r"[\w\.-]+@[\w\.-]+", json.dumps(raw_lead))
-                    if email_match:
-                        extraction_result.email = email_match.group(0)
-
-                # 4. Generate AI Response
-                context = f"Intent: {intent_result.intent}\nFields: {extraction_result.model_dump_json()}"
-                ai_response = await llm.llm.ainvoke([
-                    SystemMessage(content=WorkflowService.RESPONSE_PROMPT),
-                    HumanMessage(content=context)
-                ])
-
-                # 5. Save to DB
-                lead = WorkflowLead(
-                    raw_input=raw_lead,
-                    intent=intent_result.intent,
-                    confidence=intent_result.confidence,
-                    extracted_fields=extraction_result.model_dump(),
-                    ai_response=ai_response.content,
-                    status="processed",
-                    request_id=request_id,
-                )
-                session.add(lead)
+                steps = await WorkflowService.BATCH_PIPELINE.run(ctx)
+                lead = WorkflowService._build_lead(ctx)
+                return {
+                    "index": index,
+                    "lead_id": str(lead.id),
+                    "status": lead.status,
+                    "intent": lead.intent,
+                    "confidence": lead.confidence,
+                    "extracted_fields": lead.extracted_fields,
+                    "ai_response": lead.ai_response,
+                    "execution_trace": {
+                        "request_id": request_id,
+                        "extraction_path": ctx["extraction_path"],
+                        "llm_fields": ctx["llm_fields"],
+                        "steps": steps,
+                    },
+                }, lead
+            except Exception as e:
+                error = str(e)
+
+        return WorkflowService._failed_result(index, raw_lead, request_id, error)
+
+    @staticmethod
+    def _failed_result(index: int, raw_lead, request_id: str, error: str) -> tuple[dict, WorkflowLead]:
+        structlog.get_logger().bind(request_id=request_id).warning("batch_lead_failed", index=index, error=error)
+        lead = WorkflowLead(
+            raw_input=raw_lead,
+            intent="unknown",
+            confidence=0.0,
+            extracted_fields={},
+            status=WorkflowStatus.failed,
+            request_id=request_id,
+        )
+        return {"index": index, "lead_id": str(lead.id), "status": lead.status, "error": error}, lead
+
+    @staticmethod
+    async def _bulk_insert(leads: list[WorkflowLead]):
+        # one multi-row INSERT per batch instead of a commit per lead
+        with timed("workflow", "bulk_insert"):
+            async with AsyncSessionLocal() as session:
+                await session.execute(insert(WorkflowLead), [lead.model_dump() for lead in leads])
                 await session.commit()
-                await session.refresh(lead)
 
-                logger.info("lead_processed", lead_id=str(lead.id), intent=intent_result.intent)
+    @staticmethod
+    async def process_batch(raw_leads: Iterable, concurrency: int | None = None) -> AsyncIterator[dict]:
+        """Run leads through the workflow concurrently, yielding each result as soon as it finishes.
+
+        Items that failed to parse upstream can be passed in as exceptions; they (and any lead whose
+        pipeline raises) are reported and stored as ``failed`` without affecting the rest of the batch.
+        The last item yielded is a ``{"summary": ...}`` record.
+        """
+        concurrency = min(concurrency or settings.workflow_batch_concurrency, settings.workflow_batch_concurrency)
+        slots = asyncio.Semaphore(concurrency)
+        finished: asyncio.Queue = asyncio.Queue()
+        counts = {"total": 0, "processed": 0, "failed": 0, "persisted": 0, "persist_errors": 0}
+        started = time.perf_counter()
+
+        async def run_one(index: int, raw_lead):
+            try:
+                # a batch is already bounded by `concurrency`, so it queues for LLM capacity rather than failing
+                with patient():
+                    result = await WorkflowService._analyze_for_batch(index, raw_lead)
+            except (Exception, asyncio.CancelledError) as e:
+                # a shared call this lead was waiting on may have been cancelled by another lead; only a
+                # cancellation of this task itself (the batch being torn down) stops it without a result
+                if isinstance(e, asyncio.CancelledError) and asyncio.current_task().cancelling():
+                    raise
+                raw_input = raw_lead if isinstance(raw_lead, dict) else {}
+                result = WorkflowService._failed_result(index, raw_input, str(uuid4()), str(e) or type(e).__name__)
+            finally:
+                slots.release()
+            await finished.put(result)
 
-                return WorkflowResponse(
-                    lead_id=lead.id,
-                    intent=lead.intent,
-                    confidence=lead.confidence,
-                    extracted_fields=LeadFields(**lead.extracted_fields),
-                    ai_response=lead.ai_response or "",
-                    status=lead.status,
-                    execution_trace={"intent_confidence": lead.confidence, "request_id": request_id}
-                )
+        async def produce():
+            tasks = set()
+            try:
+                for index, raw_lead in enumerate(raw_leads):
+                    # only `concurrency` leads are ever in flight, however large the upload is
+                    await slots.acquire()
+                    counts["total"] += 1
+                    task = asyncio.create_task(run_one(index, raw_lead))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*tasks, return_exceptions=True)
+            finally:
+                # the consumer stops on this, so it must arrive even if producing failed
+                finished.put_nowait(None)
 
+        async def flush(rows: list[WorkflowLead]):
+            try:
+                await WorkflowService._bulk_insert(rows)
+                counts["persisted"] += len(rows)
             except Exception as e:
-                await session.rollback()
-                logger.error("lead_processing_failed", error=str(e), request_id=request_id)
-                raise DatabaseError("Failed to process lead") from e
\ No newline at end of file
+                counts["persist_errors"] += len(rows)
+                logger.error("batch_insert_failed", rows=len(rows), error=str(e))
+
+        producer = asyncio.create_task(produce())
+        pending_rows: list[WorkflowLead] = []
+        try:
+            while (item := await finished.get()) is not None:
+                result, lead = item
+                counts["failed" if result["status"] == WorkflowStatus.failed else "processed"] += 1
+                pending_rows.append(lead)
+                if len(pending_rows) >= settings.workflow_batch_insert_size:
+                    await flush(pending_rows)
+                    pending_rows = []
+                yield result
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            if pending_rows:
+                await flush(pending_rows)
+
+        counts["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("lead_batch_processed", concurrency=concurrency, **counts)
+        yield {"summary": counts}
@@ -1,12 +1,27 @@
-from fastapi import FastAPI
+import time
+
+# measured from here, so /ready can report what importing the app cost
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from starlette.routing import Match
+from core.config import settings
 from core.database import init_db
+from core.write_behind import write_behind
+from core.llm_client import llm_client
 from core.exceptions import AppBaseException
+from core.metrics import HTTP_LATENCY, current_endpoint, render_metrics
 from assessments.workflow_automation.routers import router
 from assessments.rag_chatbot.routers import router as rag_router
+from assessments.rag_chatbot.jobs import ingest_jobs
+from assessments.rag_chatbot.loaders import shutdown_parse_pool
+from backend.warmup import warmup
 import asyncio
 
+warmup.record("imports", time.perf_counter() - _import_started)
+
 app = FastAPI(title="AI Engineering Assessment - Assessment 1")
 
 app.add_middleware(
@@ -17,13 +32,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.metrics_enabled:
+    @app.middleware("http")
+    async def record_request_metrics(request: Request, call_next):
+        # label by route template, not raw path, so ids in URLs don't explode the series count
+        route = next(
+            (r.path for r in request.app.router.routes if r.matches(request.scope)[0] == Match.FULL),
+            "unmatched",
+        )
+        token = current_endpoint.set(route)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            HTTP_LATENCY.labels(request.method, route, str(status)).observe(time.perf_counter() - started)
+            current_endpoint.reset(token)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        body, content_type = render_metrics()
+        return Response(body, media_type=content_type)
+
 @app.exception_handler(AppBaseException)
 async def app_exception_handler(_, exc: AppBaseException):
-    return JSONResponse(status_code=exc.status_code, content={"code": exc.code, "detail": str(exc)})
+    retry_after = getattr(exc, "retry_after", None)
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"code": exc.code, "detail": str(exc)},
+        headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
+    )
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    # liveness is the port answering at all; readiness waits for the warm-up
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
 
 @app.on_event("startup")
 async def startup():
+    started = time.perf_counter()
     await init_db()
+    await ingest_jobs.recover()
+    if settings.write_behind_enabled:
+        await write_behind.start()
+    warmup.record("startup", time.perf_counter() - started)
+    # in the background, so the server is listening (and /ready answering 503) while it runs
+    warmup.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # stop ingests at the next file boundary, then flush every queued chat message / lead
+    await warmup.aclose()
+    await ingest_jobs.aclose()
+    shutdown_parse_pool()
+    await write_behind.stop()
+    await llm_client.aclose()
 
 app.include_router(router)
 app.include_router(rag_router)
\ No newline at end of file
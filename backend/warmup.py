@@ -0,0 +1,99 @@
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.embedding_client import embedding_client
+from core.llm_client import llm_client
+from core.metrics import register_stats
+from core.vector_store import VectorStoreManager
+from assessments.rag_chatbot.prompt_builder import count_tokens
+from sqlalchemy import text
+import asyncio
+import numpy as np
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+
+class WarmUp:
+    """Startup work the first requests would otherwise pay for, run before the instance reports ready.
+
+    Steps run in the order given by `WARMUP_STEPS`; a failing step is logged and reported by `/ready`
+    but does not keep the instance out of rotation, since the request path retries the same work.
+    """
+
+    def __init__(self, steps: list[str], company_ids: list[str]):
+        self.steps = steps
+        self.company_ids = company_ids
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self.ready = False
+        self._task: asyncio.Task | None = None
+
+    def record(self, phase: str, seconds: float):
+        self.timings[phase] = round(seconds, 3)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run(), name="warmup")
+
+    async def run(self):
+        started = time.perf_counter()
+        for name in self.steps:
+            step = getattr(self, f"_warm_{name}", None)
+            if step is None:
+                logger.warning("warmup_step_unknown", step=name)
+                continue
+            step_started = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                logger.warning("warmup_step_failed", step=name, error=str(e))
+            self.record(name, time.perf_counter() - step_started)
+        self.record("warmup", time.perf_counter() - started)
+        self.ready = True
+        logger.info("warmup_complete", timings=self.timings, errors=self.errors)
+
+    async def aclose(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    @staticmethod
+    async def _warm_database():
+        async with AsyncSessionLocal() as session:
+            await session.execute(text("SELECT 1"))
+
+    @staticmethod
+    async def _warm_llm():
+        await llm_client.warm_up()
+
+    @staticmethod
+    async def _warm_embeddings():
+        # blocking imports run in a thread so /ready keeps answering during the warm-up
+        await asyncio.to_thread(embedding_client.get_embeddings)
+
+    async def _warm_vector_index(self):
+        for company_id in self.company_ids:
+            vectorstore = await asyncio.to_thread(VectorStoreManager.get_vectorstore, company_id)
+            if vectorstore.index.ntotal:
+                # one search pages the memory-mapped index in, so the first query does not hit the disk
+                probe = np.zeros((1, vectorstore.index.d), dtype=np.float32)
+                await asyncio.to_thread(vectorstore.index.search, probe, 1)
+
+    @staticmethod
+    async def _warm_tokenizer():
+        await asyncio.to_thread(count_tokens, "warm up")
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "warming_up",
+            "timings": self.timings,
+            "errors": self.errors,
+        }
+
+    def stats(self) -> dict:
+        return {"ready": int(self.ready), **{f"{phase}_seconds": seconds for phase, seconds in self.timings.items()}}
+
+
+warmup = WarmUp(steps=settings.warmup_steps, company_ids=settings.warmup_company_ids)
+register_stats("startup", warmup.stats)
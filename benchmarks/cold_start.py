@@ -0,0 +1,140 @@
+"""Cold-start benchmark: how long a fresh app process takes to import, listen, report ready and serve a chat.
+
+Builds an index once, then starts uvicorn from scratch for every run (against the mock OpenAI server)
+and times each milestone from process launch. Runs alternate between the configured warm-up and none,
+so the table shows what the warm-up moves out of the first request:
+
+    python -m benchmarks.cold_start --runs 5 --output benchmarks/results/cold_start.json
+"""
+from benchmarks.load_test import (
+    add_server_arguments, app_env, chat_payload, git_commit, ingest, start_app, start_mock, stop, wait_ready,
+)
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+import httpx
+
+MODES = {
+    "warmup": None,  # WARMUP_STEPS from the environment / .env, i.e. the app default
+    "no_warmup": "[]",
+}
+
+
+async def launch(env: dict, workdir: str, run: int, timeout: float) -> dict:
+    started = time.perf_counter()
+    app, url = start_app(env, workdir)
+    timings: dict[str, float | None] = {"listening_s": None, "ready_s": None}
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            deadline = started + timeout
+            while timings["ready_s"] is None:
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"app not ready after {timeout}s")
+                if app.poll() is not None:
+                    raise RuntimeError(f"app exited with code {app.returncode}")
+                try:
+                    response = await client.get("/ready")
+                except httpx.TransportError:
+                    await asyncio.sleep(0.02)
+                    continue
+                elapsed = time.perf_counter() - started
+                timings["listening_s"] = timings["listening_s"] or elapsed
+                if response.status_code == 200:
+                    timings["ready_s"] = elapsed
+                    ready = response.json()
+                else:
+                    await asyncio.sleep(0.02)
+
+            request_started = time.perf_counter()
+            response = await client.post("/api/02-rag/chat", json=chat_payload(run))
+            response.raise_for_status()
+            finished = time.perf_counter()
+            # the same request once everything is loaded, for comparison
+            await client.post("/api/02-rag/chat", json=chat_payload(run + 1000))
+            second_ms = (time.perf_counter() - finished) * 1000
+    finally:
+        stop([app])
+    return {
+        "import_s": ready["timings"].get("imports"),
+        **timings,
+        "first_request_s": finished - started,
+        "first_request_ms": (finished - request_started) * 1000,
+        "second_request_ms": second_ms,
+        "warmup": ready["timings"],
+        "warmup_errors": ready["errors"],
+    }
+
+
+def summarize(runs: list[dict]) -> dict:
+    keys = ("import_s", "listening_s", "ready_s", "first_request_s", "first_request_ms", "second_request_ms")
+    return {key: round(statistics.median(run[key] for run in runs), 3) for key in keys}
+
+
+async def main(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    mock, mock_url = start_mock(args, workdir)
+    try:
+        await wait_ready(f"{mock_url}/v1/stats", mock)
+        env = app_env(args, workdir, mock_url)
+
+        # one throwaway process builds the shard the measured runs load
+        app, url = start_app(env, workdir)
+        try:
+            await wait_ready(f"{url}/ready", app, ok_only=True)
+            async with httpx.AsyncClient(base_url=url, timeout=args.timeout) as client:
+                await ingest(client, "acme-corp")
+        finally:
+            stop([app])
+        print(f"🧪 index built, mock OpenAI {mock_url} (logs in {workdir})")
+
+        runs = {mode: [] for mode in args.modes}
+        for run in range(args.runs):
+            for mode in args.modes:
+                mode_env = dict(env)
+                if MODES[mode] is not None:
+                    mode_env["WARMUP_STEPS"] = MODES[mode]
+                runs[mode].append(await launch(mode_env, workdir, run, args.timeout))
+    finally:
+        stop([mock])
+
+    results = {mode: {"median": summarize(mode_runs), "runs": mode_runs} for mode, mode_runs in runs.items()}
+    print(f"{'mode':<11}{'import s':>10}{'listen s':>10}{'ready s':>10}{'1st ok s':>10}{'1st req ms':>12}{'2nd req ms':>12}")
+    for mode, result in results.items():
+        m = result["median"]
+        print(
+            f"{mode:<11}{m['import_s']:>10}{m['listening_s']:>10}{m['ready_s']:>10}"
+            f"{m['first_request_s']:>10}{m['first_request_ms']:>12}{m['second_request_ms']:>12}"
+        )
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app import time, readiness and time to first successful chat")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--timeout", type=float, default=120)
+    # a fast mock, so the numbers are the app's own startup cost rather than simulated generation time
+    add_server_arguments(parser, mock_latency_ms=50, mock_tokens_per_second=0)
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,282 @@
+"""Throughput and tail-latency benchmark for the lead workflow and RAG chat endpoints.
+
+Starts the mock OpenAI server and the FastAPI app (uvicorn) as subprocesses pointed at it,
+drives each endpoint at one or more concurrency levels and writes the results to JSON:
+
+    python -m benchmarks.load_test --concurrency 1 8 32 --requests 200 --output benchmarks/results/run.json
+
+Use ``--app-url`` to benchmark an app that is already running (it must be using the mock server,
+or you will be billed for real calls).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+QUERIES = [
+    "What does the company do?",
+    "When was Acme founded?",
+    "Tell me about your consulting services",
+    "What projects are you working on?",
+    "Do you do research into energy?",
+]
+
+
+def lead_payload(i: int) -> dict:
+    # alternate clean leads (rule-based extraction only) with free-text ones that need the LLM
+    if i % 2 == 0:
+        return {"name": f"Lead {i}", "email": f"lead{i}@example.com", "company": "Example Co", "message": "Looking for a demo"}
+    return {"message": f"Hi, this is request {i}. We want pricing for 50 seats, budget around $20k."}
+
+
+def chat_payload(i: int) -> dict:
+    # a per-request suffix keeps identical queries from being answered by the semantic cache
+    return {"query": f"{QUERIES[i % len(QUERIES)]} (#{i})", "company_id": "acme-corp", "refine": False}
+
+
+ENDPOINTS = {
+    "leads": ("/api/01-workflow/leads", lead_payload),
+    "rag_chat": ("/api/02-rag/chat", chat_payload),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_ready(url: str, process: subprocess.Popen | None, timeout: float = 60, ok_only: bool = False):
+    """Wait until `url` answers (with a 2xx if `ok_only`)."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                response = await client.get(url, timeout=2)
+                if not ok_only or response.is_success:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_level(client: httpx.AsyncClient, name: str, concurrency: int, requests: int, warmup: int) -> dict:
+    path, make_payload = ENDPOINTS[name]
+    counter = itertools.count()
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+
+    async def worker(total: int, record: bool):
+        while (i := next(counter)) < total:
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=make_payload(i))
+                status = str(response.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            if record:
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[status] += 1
+
+    if warmup:
+        await asyncio.gather(*(worker(warmup, record=False) for _ in range(min(concurrency, warmup))))
+        counter = itertools.count(warmup)
+        requests += warmup
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(requests, record=True) for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    ok = statuses.get("200", 0)
+    return {
+        "endpoint": name,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "status_counts": dict(statuses),
+        "duration_s": round(duration, 3),
+        "rps": round(len(latencies) / duration, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 1),
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "max": round(max(latencies), 1),
+        },
+    }
+
+
+async def ingest(client: httpx.AsyncClient, company_id: str, timeout: float = 600):
+    response = await client.post("/api/02-rag/ingest", params={"company_id": company_id})
+    response.raise_for_status()
+    job = response.json()
+    deadline = time.monotonic() + timeout
+    while job["status"] in ("queued", "running"):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"ingest job {job['job_id']} still {job['status']} after {timeout}s")
+        await asyncio.sleep(0.5)
+        job = (await client.get(f"/api/02-rag/ingest/{job['job_id']}")).json()
+    if job["status"] != "succeeded":
+        raise RuntimeError(f"ingest job {job['job_id']} {job['status']}: {job['errors']}")
+
+
+def start_mock(args, workdir: str) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    log = open(os.path.join(workdir, "mock_openai.log"), "w")
+    mock = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.mock_openai", "--port", str(port),
+            "--latency-ms", str(args.mock_latency_ms), "--jitter-ms", str(args.mock_jitter_ms),
+            "--tokens-per-second", str(args.mock_tokens_per_second),
+            "--embedding-latency-ms", str(args.mock_embedding_latency_ms),
+            "--error-rate", str(args.mock_error_rate), "--error-status", str(args.mock_error_status),
+            "--seed", "0",
+        ],
+        cwd=ROOT, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return mock, f"http://127.0.0.1:{port}"
+
+
+def app_env(args, workdir: str, mock_url: str) -> dict:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-mock",
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "DB_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "FAISS_INDEX_PATH": os.path.join(workdir, "faiss"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, "llm_cache.sqlite"),
+        # mock embeddings carry no meaning, so real thresholds would refuse every chat query without an LLM call
+        "RAG_SCORE_THRESHOLD": str(args.rag_score_threshold),
+    }
+    if not args.keep_caches:
+        # measure the uncached request path unless told otherwise
+        env.update({"SEMANTIC_CACHE_ENABLED": "false", "RESPONSE_CACHE_ENABLED": "false"})
+    return env
+
+
+def start_app(env: dict, workdir: str, workers: int = 1) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    log = open(os.path.join(workdir, "app.log"), "a")
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return app, f"http://127.0.0.1:{port}"
+
+
+def start_servers(args, workdir: str) -> tuple[str, list[subprocess.Popen], str]:
+    mock, mock_url = start_mock(args, workdir)
+    app, app_url = start_app(app_env(args, workdir, mock_url), workdir, args.workers)
+    return app_url, [app, mock], mock_url
+
+
+def stop(processes: list[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def main(args) -> dict:
+    processes: list[subprocess.Popen] = []
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    try:
+        app_url = args.app_url
+        if app_url is None:
+            app_url, processes, mock_url = start_servers(args, workdir)
+            await wait_ready(f"{mock_url}/v1/stats", processes[1])
+            # past warm-up, so the first measured requests do not pay for it
+            await wait_ready(f"{app_url}/ready", processes[0], ok_only=True)
+            print(f"🧪 app {app_url} → mock OpenAI {mock_url} (logs in {workdir})")
+        print(f"{'endpoint':<10}{'conc':>5}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=limits) as client:
+            if "rag_chat" in args.endpoints:
+                await ingest(client, "acme-corp")
+            results = []
+            for name in args.endpoints:
+                for concurrency in args.concurrency:
+                    result = await run_level(client, name, concurrency, args.requests, args.warmup)
+                    results.append(result)
+                    lat = result["latency_ms"]
+                    print(
+                        f"{name:<10}{concurrency:>5}{result['rps']:>10}{lat['p50']:>10}{lat['p95']:>10}"
+                        f"{lat['p99']:>10}{result['errors']:>8}"
+                    )
+    finally:
+        stop(processes)
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return report
+
+
+def add_server_arguments(parser: argparse.ArgumentParser, mock_latency_ms: float = 300, mock_tokens_per_second: float = 80):
+    parser.add_argument("--keep-caches", action="store_true", help="leave the semantic/response caches enabled")
+    parser.add_argument("--rag-score-threshold", type=float, default=0.0, help="RAG_SCORE_THRESHOLD for the started app")
+    parser.add_argument("--mock-latency-ms", type=float, default=mock_latency_ms)
+    parser.add_argument("--mock-jitter-ms", type=float, default=50)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=mock_tokens_per_second)
+    parser.add_argument("--mock-embedding-latency-ms", type=float, default=40)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-error-status", type=int, default=429)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the workflow and RAG endpoints against a mock OpenAI server")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[8], help="one or more levels to sweep")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint and level")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests before each level")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--app-url", default=None, help="benchmark an already running app instead of starting one")
+    add_server_arguments(parser)
+    parser.add_argument("--output", default=None, help="JSON file for the results, e.g. benchmarks/results/<commit>.json")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,187 @@
+"""Local stand-in for the OpenAI chat completions and embeddings endpoints.
+
+Latency, token rate and error injection are configurable so the app can be load tested
+without touching (or paying for) the real API:
+
+    python -m benchmarks.mock_openai --port 9100 --latency-ms 300 --tokens-per-second 80 --error-rate 0.01
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+import uuid
+import numpy as np
+import uvicorn
+
+app = FastAPI(title="Mock OpenAI")
+
+config = {
+    "latency_ms": 300.0,
+    "jitter_ms": 50.0,
+    "tokens_per_second": 80.0,
+    "completion_tokens": 60,
+    "embedding_latency_ms": 40.0,
+    "error_rate": 0.0,
+    "error_status": 429,
+}
+stats = {"chat": 0, "chat_stream": 0, "embeddings": 0, "errors": 0}
+
+INTENT = {"intent": "sales", "confidence": 0.92}
+LEAD_FIELDS = {
+    "name": "Jordan Lee",
+    "email": "jordan.lee@example.com",
+    "company": "Example Co",
+    "phone": None,
+    "budget": 25000,
+    "message_summary": "Wants a demo for their sales team.",
+}
+WORDS = (
+    "Acme Corp builds AI driven widget solutions and offers consulting services to clients "
+    "around the world with a focus on engineering quality and sustainable energy research"
+).split()
+
+
+def _tokens(text: str) -> int:
+    # close enough to tiktoken for latency modelling
+    return max(1, len(text) // 4)
+
+
+def _completion(messages: list[dict]) -> str:
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    if "lead routing" in system:
+        return json.dumps(INTENT)
+    if "Extract fields" in system:
+        return json.dumps(LEAD_FIELDS)
+    n = config["completion_tokens"]
+    return " ".join(WORDS[i % len(WORDS)] for i in range(n)) + "."
+
+
+def _first_token_delay() -> float:
+    return max(0.0, config["latency_ms"] + random.uniform(-config["jitter_ms"], config["jitter_ms"])) / 1000
+
+
+def _injected_error() -> JSONResponse | None:
+    if random.random() >= config["error_rate"]:
+        return None
+    stats["errors"] += 1
+    status = config["error_status"]
+    headers = {"retry-after": "1"} if status == 429 else None
+    body = {"error": {"message": f"injected error ({status})", "type": "mock_error", "code": str(status)}}
+    return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    if (error := _injected_error()) is not None:
+        return error
+
+    content = _completion(payload.get("messages", []))
+    prompt_tokens = sum(_tokens(m.get("content") or "") for m in payload.get("messages", []))
+    completion_tokens = _tokens(content)
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+    base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": payload.get("model", "mock")}
+    per_token = 1 / config["tokens_per_second"] if config["tokens_per_second"] > 0 else 0.0
+
+    if not payload.get("stream"):
+        stats["chat"] += 1
+        await asyncio.sleep(_first_token_delay() + completion_tokens * per_token)
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    stats["chat_stream"] += 1
+    include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+
+    async def events():
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            body = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+            return f"data: {json.dumps(body)}\n\n"
+
+        await asyncio.sleep(_first_token_delay())
+        yield chunk({"role": "assistant", "content": ""})
+        pieces = content.split(" ")
+        for i, piece in enumerate(pieces):
+            yield chunk({"content": piece if i == 0 else " " + piece})
+            # spread the token budget over the words actually sent
+            await asyncio.sleep(per_token * completion_tokens / len(pieces))
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _embedding(item, dimensions: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(json.dumps(item).encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    payload = await request.json()
+    if (error := _injected_error()) is not None:
+        return error
+    stats["embeddings"] += 1
+
+    inputs = payload.get("input", [])
+    # a single string or a single list of token ids is one input
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    dimensions = payload.get("dimensions") or 1536
+    await asyncio.sleep(config["embedding_latency_ms"] / 1000)
+
+    data = []
+    for i, item in enumerate(inputs):
+        vector = _embedding(item, dimensions)
+        if payload.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+    tokens = sum(_tokens(item) if isinstance(item, str) else len(item) for item in inputs)
+    return {"object": "list", "data": data, "model": payload.get("model", "mock"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+@app.get("/v1/models")
+async def models():
+    # the app's warm-up primes its connection pool with this call
+    return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]}
+
+
+@app.get("/v1/stats")
+async def get_stats():
+    return {"config": config, **stats}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenAI server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"])
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"], help="0 = instant")
+    parser.add_argument("--completion-tokens", type=int, default=config["completion_tokens"], help="length of free-text answers, in words")
+    parser.add_argument("--embedding-latency-ms", type=float, default=config["embedding_latency_ms"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=config["error_status"])
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config.update({k: v for k, v in vars(args).items() if k in config})
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
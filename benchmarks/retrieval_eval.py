@@ -0,0 +1,286 @@
+"""Offline retrieval quality vs. latency benchmark for the RAG chunking, k, index type and threshold settings.
+
+Chunks a labelled corpus with the same loader/splitter as ingestion, embeds it with a deterministic
+hashing embedding (no network, identical results on every run), then for every combination of chunk
+size, overlap, index type and k reports recall@k, MRR, index build time, index memory and p50/p99
+search latency:
+
+    python -m benchmarks.retrieval_eval --chunk-sizes 400 800 1200 --k 3 6 10 --output benchmarks/results/retrieval.json
+
+The labelled set lives in ``benchmarks/data/retrieval``: text/markdown files under ``corpus/`` and
+``queries.jsonl`` lines of ``{"id", "query", "answers": [{"source", "text"}]}``, where ``text`` is the
+exact passage of ``source`` that answers the query (an empty list marks a question the corpus cannot
+answer). A retrieved chunk counts as relevant when it covers at least half of an answer passage, so
+labels do not depend on how the corpus is chunked.
+
+Hashing embeddings only see shared words, so compare settings with them rather than reading the
+scores as absolute; ``--embeddings app`` uses the app's configured embedding client instead (network,
+and billed unless OPENAI_BASE_URL points at a mock).
+"""
+import os
+
+# core.config requires a key even though the default (hashing) embeddings never call the API
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+
+from assessments.rag_chatbot.loaders import parse_file
+from benchmarks.load_test import git_commit
+from core.faiss_index import INDEX_TYPES, build_index, index_memory_bytes
+from langchain_core.embeddings import Embeddings
+from collections import Counter
+from datetime import datetime, timezone
+import argparse
+import hashlib
+import json
+import math
+import re
+import time
+import numpy as np
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "retrieval")
+TEXT_EXTENSIONS = (".txt", ".md", ".markdown")
+# a chunk must cover this share of an answer passage to count as retrieving it
+MIN_ANSWER_COVERAGE = 0.5
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and any are as at be by can do does for from has have how i in is it its of on or our so than that the "
+    "their there this to was we what when where which who will with you your".split()
+)
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words vectors: word unigrams and bigrams hashed into `dim` signed buckets, L2-normalised.
+
+    `fit` weights features by inverse document frequency over the corpus files, so rare words (names,
+    products, numbers) count for more than words every document shares.
+    """
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.idf: dict[str, float] = {}
+
+    def fit(self, documents: list[str]) -> "HashingEmbeddings":
+        frequency = Counter(feature for text in documents for feature in set(self._features(text)))
+        self.idf = {feature: math.log((1 + len(documents)) / (1 + count)) + 1 for feature, count in frequency.items()}
+        return self
+
+    @staticmethod
+    def _words(text: str) -> list[str]:
+        # crude plural folding so "engineers" matches "engineer"
+        return [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+
+    def _features(self, text: str) -> list[str]:
+        words = self._words(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def _vector(self, text: str) -> list[float]:
+        # features never seen in the corpus get the highest weight a corpus feature could have
+        unseen = max(self.idf.values(), default=1.0)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in Counter(self._features(text)).items():
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            weight = (1 + math.log(count)) * self.idf.get(feature, unseen)
+            vector[bucket] += weight if digest[4] & 1 else -weight
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._vector(text)
+
+
+def load_dataset(corpus_dir: str, queries_path: str) -> tuple[list[str], list[dict]]:
+    """Return the corpus files and the queries, each answer resolved to a ``(source, start, end)`` span."""
+    files = sorted(
+        os.path.join(corpus_dir, name) for name in os.listdir(corpus_dir) if name.lower().endswith(TEXT_EXTENSIONS)
+    )
+    if not files:
+        raise ValueError(f"no {'/'.join(TEXT_EXTENSIONS)} files in {corpus_dir}")
+    texts = {os.path.basename(path): open(path, encoding="utf-8").read() for path in files}
+
+    queries = []
+    with open(queries_path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            query = json.loads(line)
+            spans = []
+            for answer in query["answers"]:
+                start = texts.get(answer["source"], "").find(answer["text"])
+                if start < 0:
+                    raise ValueError(f"{query['id']}: answer not found in {answer['source']}: {answer['text']!r}")
+                spans.append((answer["source"], start, start + len(answer["text"])))
+            queries.append({**query, "spans": spans})
+    return files, queries
+
+
+def chunk_corpus(files: list[str], chunk_size: int, chunk_overlap: int) -> list[tuple[str, int, int, str]]:
+    chunks = []
+    for path in files:
+        docs, _ = parse_file(path, "benchmark", chunk_size, chunk_overlap)
+        for doc in docs:
+            start = doc.metadata["start_index"]
+            chunks.append((os.path.basename(path), start, start + len(doc.page_content), doc.page_content))
+    return chunks
+
+
+def covers(chunk: tuple[str, int, int, str], span: tuple[str, int, int]) -> bool:
+    source, start, end, _ = chunk
+    overlap = min(end, span[2]) - max(start, span[1])
+    return source == span[0] and overlap >= MIN_ANSWER_COVERAGE * (span[2] - span[1])
+
+
+def score_ranking(ranked: list[int], chunks: list, spans: list) -> tuple[float, float]:
+    """Recall (share of answer spans covered by the ranked chunks) and reciprocal rank of the first relevant chunk."""
+    found = {i for i, span in enumerate(spans) for position in ranked if covers(chunks[position], span)}
+    first = next((rank for rank, position in enumerate(ranked, 1) if any(covers(chunks[position], s) for s in spans)), None)
+    return len(found) / len(spans), 1 / first if first else 0.0
+
+
+def evaluate(index, chunks: list, queries: list[dict], query_vectors: np.ndarray, k: int, repeat: int) -> dict:
+    answerable = [i for i, query in enumerate(queries) if query["spans"]]
+    latencies = []
+    rankings = []
+    for i in range(len(queries)):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _, positions = index.search(query_vectors[i : i + 1], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        rankings.append([int(p) for p in positions[0] if p >= 0])
+    scores = [score_ranking(rankings[i], chunks, queries[i]["spans"]) for i in answerable]
+    return {
+        "recall_at_k": round(float(np.mean([recall for recall, _ in scores])), 4),
+        "mrr": round(float(np.mean([rr for _, rr in scores])), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+    }
+
+
+def threshold_report(index, queries: list[dict], query_vectors: np.ndarray, thresholds: list[float]) -> list[dict]:
+    """How many answerable questions clear each refusal threshold, and how many unanswerable ones are refused."""
+    distances, _ = index.search(query_vectors, 1)
+    # unit vectors: squared L2 distance d is cosine similarity 1 - d/2, as in RAGService._retrieve
+    best = np.clip(1 - distances[:, 0] / 2, 0.0, 1.0)
+    answerable = np.array([bool(query["spans"]) for query in queries])
+    rows = []
+    for threshold in thresholds:
+        rows.append({
+            "threshold": threshold,
+            "answered": round(float(np.mean(best[answerable] >= threshold)), 4) if answerable.any() else None,
+            "refused_unanswerable": round(float(np.mean(best[~answerable] < threshold)), 4) if (~answerable).any() else None,
+        })
+    return rows
+
+
+def make_embeddings(args, files: list[str]) -> Embeddings:
+    if args.embeddings == "app":
+        from core.embedding_client import embedding_client
+
+        return embedding_client.get_embeddings()
+    # fitted on whole files, so every chunking is embedded with the same weights
+    return HashingEmbeddings(args.dim).fit([open(path, encoding="utf-8").read() for path in files])
+
+
+def main(args) -> dict:
+    files, queries = load_dataset(args.corpus, args.queries)
+    embeddings = make_embeddings(args, files)
+    query_vectors = np.asarray(embeddings.embed_documents([query["query"] for query in queries]), dtype=np.float32)
+    dim = query_vectors.shape[1]
+    print(
+        f"🧪 {len(files)} files, {len(queries)} queries "
+        f"({sum(not q['spans'] for q in queries)} unanswerable), {args.embeddings} embeddings ({dim}d)"
+    )
+
+    results, thresholds = [], []
+    header = f"{'chunk':>6}{'overlap':>8}{'chunks':>7}  {'index':<9}{'k':>3}{'recall':>8}{'mrr':>8}{'build ms':>10}{'mem KB':>9}{'p50 ms':>9}{'p99 ms':>9}"
+    print(header)
+    for chunk_size in args.chunk_sizes:
+        for chunk_overlap in args.chunk_overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+            chunks = chunk_corpus(files, chunk_size, chunk_overlap)
+            started = time.perf_counter()
+            vectors = np.asarray(embeddings.embed_documents([chunk[3] for chunk in chunks]), dtype=np.float32)
+            embed_s = time.perf_counter() - started
+            for index_type in args.index_types:
+                base = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "chunks": len(chunks), "index_type": index_type}
+                try:
+                    started = time.perf_counter()
+                    index = build_index(index_type, vectors, dim)
+                    build_ms = (time.perf_counter() - started) * 1000
+                except ValueError as e:
+                    # e.g. IVF/PQ on fewer vectors than it needs to train
+                    results.append({**base, "error": str(e)})
+                    print(f"{chunk_size:>6}{chunk_overlap:>8}{len(chunks):>7}  {index_type:<9}  skipped: {e}")
+                    continue
+                memory = index_memory_bytes(index)
+                if index_type == "flat":
+                    thresholds.append({
+                        "chunk_size": chunk_size,
+                        "chunk_overlap": chunk_overlap,
+                        "rows": threshold_report(index, queries, query_vectors, args.thresholds),
+                    })
+                for k in args.k:
+                    row = {
+                        **base,
+                        "k": k,
+                        **evaluate(index, chunks, queries, query_vectors, k, args.repeat),
+                        "build_ms": round(build_ms, 3),
+                        "embed_s": round(embed_s, 3),
+                        "memory_bytes": memory,
+                    }
+                    results.append(row)
+                    print(
+                        f"{chunk_size:>6}{chunk_overlap:>8}{len(chunks):>7}  {index_type:<9}{k:>3}{row['recall_at_k']:>8.3f}"
+                        f"{row['mrr']:>8.3f}{row['build_ms']:>10.2f}{memory / 1024:>9.1f}{row['p50_ms']:>9.4f}{row['p99_ms']:>9.4f}"
+                    )
+
+    print(f"\n{'chunk':>6}{'overlap':>8}{'threshold':>11}{'answered':>10}{'refused':>9}   (flat index, best score per query)")
+    for entry in thresholds:
+        for row in entry["rows"]:
+            answered = "-" if row["answered"] is None else f"{row['answered']:.3f}"
+            refused = "-" if row["refused_unanswerable"] is None else f"{row['refused_unanswerable']:.3f}"
+            print(f"{entry['chunk_size']:>6}{entry['chunk_overlap']:>8}{row['threshold']:>11}{answered:>10}{refused:>9}")
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "dataset": {
+            "files": len(files),
+            "queries": len(queries),
+            "unanswerable": sum(not query["spans"] for query in queries),
+            "dimensions": dim,
+        },
+        "results": results,
+        "thresholds": thresholds,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.output}")
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep chunking, k and index type over a labelled query set")
+    parser.add_argument("--corpus", default=os.path.join(DATA_DIR, "corpus"))
+    parser.add_argument("--queries", default=os.path.join(DATA_DIR, "queries.jsonl"))
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[200, 400, 800, 1200])
+    parser.add_argument("--chunk-overlaps", nargs="+", type=int, default=[0, 120])
+    parser.add_argument("--k", nargs="+", type=int, default=[1, 3, 6, 10])
+    parser.add_argument("--index-types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.1, 0.2, 0.3, 0.45])
+    parser.add_argument("--embeddings", choices=("hashing", "app"), default="hashing")
+    parser.add_argument("--dim", type=int, default=1024, help="hashing embedding size (FAISS_PQ_M must divide it for ivf_pq)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed searches per query, for stable percentiles")
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -10,16 +10,112 @@ class LLMSettings(BaseSettings):
 
 class Settings(BaseSettings):
     openai_api_key: str
+    # point the OpenAI clients at a compatible server instead (e.g. benchmarks/mock_openai.py)
+    openai_base_url: str | None = None
     llm: LLMSettings = LLMSettings()
     log_level: str = "INFO"
+    # Prometheus /metrics endpoint and per-route request timing
+    metrics_enabled: bool = True
     db_url: str = "sqlite+aiosqlite:///data/sqlite.db"
 
+    # work done after startup and before /ready answers 200 (an empty list reports ready straight away):
+    # database, llm (client + one pooled connection), embeddings, vector_index (WARMUP_COMPANY_IDS), tokenizer
+    warmup_steps: list[str] = ["database", "llm", "embeddings", "vector_index", "tokenizer"]
+    warmup_company_ids: list[str] = ["acme-corp"]
+
+    # optional write-behind persistence: rows are queued and committed in batches by one background task
+    write_behind_enabled: bool = False
+    write_behind_max_queue: int = 10000
+    write_behind_batch_size: int = 200
+    write_behind_flush_interval_ms: int = 50
+    # commit attempts per batch before falling back to committing its rows one at a time
+    write_behind_max_attempts: int = 3
+
+    # shared OpenAI chat client: connection pool, SDK retries and process-wide rate limits (0 = unlimited);
+    # callers that would wait longer than RATE_LIMIT_MAX_WAIT_SECONDS get a 429 with Retry-After
+    openai_max_connections: int = 100
+    openai_max_keepalive_connections: int = 20
+    openai_timeout_seconds: float = 60.0
+    openai_max_retries: int = 2
+    rate_limit_rpm: int = 500
+    rate_limit_tpm: int = 200000
+    rate_limit_max_concurrency: int = 32
+    rate_limit_max_wait_seconds: float = 5.0
+    rate_limit_output_tokens: int = 256  # assumed completion size when reserving tokens up front
+
+    # opt-in cache for LLMClient.structured_call (deterministic at temperature=0)
+    # (not prefixed with llm_ because LLM_* env vars are routed into the nested `llm` settings)
+    response_cache_enabled: bool = False
+    response_cache_path: str = "data/llm_cache.sqlite"
+    response_cache_ttl_seconds: int = 86400
+    response_cache_max_entries: int = 10000
+
+    # bulk lead endpoint: leads in flight at once (also the cap for ?concurrency=) and rows per INSERT
+    workflow_batch_concurrency: int = 8
+    workflow_batch_insert_size: int = 100
+    # lead fields that, if the rule-based extractor cannot fill them, trigger an LLM extraction call for just those fields
+    lead_required_fields: list[str] = ["name", "email"]
+
     # embedding configuration (used by RAG service)
     embedding_model: str = "text-embedding-3-small"
     embedding_dimensions: int = 1536
 
-    # local FAISS index path (without extension)
+    # two-tier embedding cache (memory LRU in front of a SQLite store)
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/embedding_cache.sqlite"
+    embedding_cache_memory_items: int = 10000
+
+    # chat query embeddings arriving within this window are sent as one batched call (0 = no batching)
+    query_embed_window_ms: float = 5.0
+    query_embed_max_batch: int = 64
+
+    # ingestion pipeline: chunks per embedding request, batches in flight, attempts per batch
+    ingest_batch_size: int = 64
+    ingest_concurrency: int = 4
+    ingest_max_attempts: int = 3
+    # worker processes that parse and split files (0 = one per CPU core)
+    ingest_parse_workers: int = 0
+    # how often a running ingest job writes its progress to rag_ingest_jobs
+    ingest_job_persist_seconds: float = 2.0
+    # a queued/running job whose worker has not written for this long is treated as dead
+    ingest_job_stale_seconds: float = 30.0
+
+    # chat memory: messages fed back into the prompt, and sessions kept in the in-process ring buffer
+    chat_history_messages: int = 6
+    chat_history_cache_sessions: int = 1000
+
+    # best retrieval similarity (0-1) below which RAG chat refuses without calling the LLM;
+    # per-company overrides as JSON, e.g. RAG_COMPANY_THRESHOLDS={"acme-corp": 0.5}
+    rag_score_threshold: float = 0.45
+    rag_company_thresholds: dict[str, float] = {}
+
+    # RAG prompt size in tokens (system prompt + context + history + question), the part of it history
+    # may use, and the word-shingle similarity at which two retrieved chunks count as duplicates
+    rag_prompt_token_budget: int = 3000
+    rag_history_token_budget: int = 600
+    rag_dedup_similarity: float = 0.85
+
+    # semantic answer cache for RAG chat (per company, dropped whenever that company re-ingests)
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.95
+    semantic_cache_ttl_seconds: int = 3600
+    semantic_cache_max_entries: int = 500
+
+    # local FAISS index directory; each company gets its own shard under <path>/shards/<company_id>
     faiss_index_path: str = "data/faiss_indexes/rag_index"
+    # how many company shards may be resident in memory before the least recently used is dropped
+    faiss_max_loaded_shards: int = 8
+    # index generations kept on disk per shard for rollback (the live one is never removed)
+    faiss_keep_generations: int = 3
+    # index type per shard: flat | ivf_flat | ivf_pq | hnsw (IVF types stay flat until they can be trained)
+    faiss_index_type: str = "flat"
+    faiss_ivf_nlist: int = 0  # 0 = derive from the shard size
+    faiss_pq_m: int = 64
+    faiss_pq_nbits: int = 8
+    faiss_hnsw_m: int = 32
+    faiss_nprobe: int = 16
+    faiss_ef_search: int = 64
+    faiss_train_sample_size: int = 50000
 
     model_config = SettingsConfigDict(
         env_file=env_path,
@@ -0,0 +1,152 @@
+from collections.abc import Iterator, MutableMapping
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+import json
+import os
+import sqlite3
+import threading
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """Chunk text and metadata in a read-only SQLite file, looked up by id only when a search returns it.
+
+    Adds and deletes are kept in memory until `write()` produces a new file, so processes that have
+    the previous file open keep reading a consistent snapshot.
+    """
+
+    def __init__(self, path: str | None = None):
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._added: dict[str, Document] = {}
+        self._deleted: set[str] = set()
+        if path and os.path.exists(path):
+            self._open(path)
+
+    def _open(self, path: str):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        old, self._conn = self._conn, conn
+        if old is not None:
+            old.close()
+
+    def _base_row(self, search: str):
+        if self._conn is None:
+            return None
+        return self._conn.execute("SELECT page_content, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+
+    def search(self, search: str) -> Document | str:
+        with self._lock:
+            if search in self._added:
+                return self._added[search]
+            row = None if search in self._deleted else self._base_row(search)
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: dict[str, Document]) -> None:
+        with self._lock:
+            overlapping = [i for i in texts if i in self._added or (i not in self._deleted and self._base_row(i))]
+            if overlapping:
+                raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+            self._added.update(texts)
+
+    def delete(self, ids: list) -> None:
+        with self._lock:
+            for doc_id in ids:
+                if self._added.pop(doc_id, None) is None:
+                    self._deleted.add(doc_id)
+
+    def position_ids(self) -> Iterator[tuple[int, str]]:
+        if self._conn is None:
+            return iter(())
+        return iter(self._conn.execute("SELECT position, doc_id FROM positions ORDER BY position").fetchall())
+
+    def position_id(self, position: int) -> str | None:
+        if self._conn is None:
+            return None
+        row = self._conn.execute("SELECT doc_id FROM positions WHERE position = ?", (position,)).fetchone()
+        return row[0] if row else None
+
+    def position_count(self) -> int:
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def write(self, path: str, index_to_docstore_id: MutableMapping[int, str]):
+        """Write base rows, pending changes and the index position map to a new file at `path`."""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with self._lock:
+            added, deleted = dict(self._added), set(self._deleted)
+            base = self._conn
+            base_path = base.execute("PRAGMA database_list").fetchone()[2] if base is not None else None
+
+        out = sqlite3.connect(tmp_path)
+        try:
+            out.execute("CREATE TABLE docs (id TEXT PRIMARY KEY, page_content TEXT NOT NULL, metadata TEXT NOT NULL)")
+            out.execute("CREATE TABLE positions (position INTEGER PRIMARY KEY, doc_id TEXT NOT NULL)")
+            if base_path:
+                out.execute("CREATE TEMP TABLE deleted (id TEXT PRIMARY KEY)")
+                out.executemany("INSERT INTO deleted VALUES (?)", ((i,) for i in deleted))
+                out.execute("ATTACH DATABASE ? AS base", (f"file:{base_path}?mode=ro",))
+                out.execute("INSERT INTO docs SELECT * FROM base.docs WHERE id NOT IN (SELECT id FROM deleted)")
+            out.executemany(
+                "INSERT OR REPLACE INTO docs VALUES (?, ?, ?)",
+                ((i, d.page_content, json.dumps(d.metadata, default=str)) for i, d in added.items()),
+            )
+            out.executemany("INSERT INTO positions VALUES (?, ?)", index_to_docstore_id.items())
+            out.commit()
+        finally:
+            out.close()
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._open(path)
+            # anything changed while we were writing stays pending for the next write
+            for doc_id in added:
+                if self._added.get(doc_id) is added[doc_id]:
+                    del self._added[doc_id]
+            self._deleted -= deleted
+
+
+class PositionMap(MutableMapping):
+    """`index_to_docstore_id` read lazily from the docstore file, with appended positions kept in memory."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self._docstore = docstore
+        self._base_len = docstore.position_count()
+        self._added: dict[int, str] = {}
+
+    def __getitem__(self, position: int) -> str:
+        position = int(position)
+        if position in self._added:
+            return self._added[position]
+        doc_id = self._docstore.position_id(position) if position < self._base_len else None
+        if doc_id is None:
+            raise KeyError(position)
+        return doc_id
+
+    def __setitem__(self, position: int, doc_id: str):
+        self._added[int(position)] = doc_id
+
+    def __delitem__(self, position: int):
+        raise TypeError("positions are append-only; assign a new mapping to the vector store instead")
+
+    def __iter__(self) -> Iterator[int]:
+        for position, _ in self._docstore.position_ids():
+            if position not in self._added:
+                yield position
+        yield from self._added
+
+    def __len__(self) -> int:
+        return self._base_len + sum(1 for p in self._added if p >= self._base_len)
+
+    def items(self):
+        for position, doc_id in self._docstore.position_ids():
+            if position not in self._added:
+                yield position, doc_id
+        yield from self._added.items()
+
+    def values(self):
+        for _, doc_id in self.items():
+            yield doc_id
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from core.metrics import record_llm_usage
+from functools import lru_cache
+from langchain_core.embeddings import Embeddings
+import asyncio
+import hashlib
+import numpy as np
+import os
+import sqlite3
+import threading
+import structlog
+
+logger = structlog.get_logger()
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+
+        # the encoding of every OpenAI embedding model since text-embedding-ada-002
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("tokenizer_unavailable", error=str(e))
+        return None
+
+
+def count_tokens(texts: list[str]) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return sum((len(text) + 3) // 4 for text in texts)
+    return sum(len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=()))
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + SQLite) store of embedding vectors for a single model/dimension namespace."""
+
+    def __init__(self, path: str, namespace: str, max_memory_items: int = 10_000):
+        self.namespace = namespace
+        self.max_memory_items = max_memory_items
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "namespace TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (namespace, text_hash))"
+        )
+        # model or dimensions changed: vectors from any other namespace can never be served again
+        stale = self._conn.execute("DELETE FROM embeddings WHERE namespace != ?", (namespace,)).rowcount
+        self._conn.commit()
+        if stale:
+            logger.info("embedding_cache_invalidated", namespace=namespace, rows_deleted=stale)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self._stats["memory_hits"] += 1
+            pending = [k for k in keys if k not in found]
+            for start in range(0, len(pending), 500):
+                batch = pending[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings "
+                    f"WHERE namespace = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [self.namespace, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+            self._stats["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, vectors: dict[str, list[float]]):
+        if not vectors:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (namespace, text_hash, vector) VALUES (?, ?, ?)",
+                [(self.namespace, key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in vectors.items()],
+            )
+            self._conn.commit()
+            for key, vec in vectors.items():
+                self._remember(key, vec)
+
+    def _remember(self, key: str, vector: list[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = lookups - self._stats["misses"]
+            return {
+                **self._stats,
+                "memory_items": len(self._memory),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only sends texts missing from the cache to the underlying model.
+
+    The tokens of the texts that are sent are recorded as `model` usage, so embedding spend shows up
+    next to the chat model's on /metrics (the embeddings client does not return the API's own count).
+    """
+
+    def __init__(self, underlying: Embeddings, cache: EmbeddingCache, model: str):
+        self.underlying = underlying
+        self.cache = cache
+        self.model = model
+
+    def _missing(self, texts: list[str], keys: list[str], found: dict) -> dict[str, str]:
+        # de-duplicate so identical texts in one batch cost a single embedding
+        return {key: text for key, text in zip(keys, texts) if key not in found}
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [_text_key(t) for t in texts]
+        found = self.cache.get_many(keys)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            fresh = dict(zip(missing, self.underlying.embed_documents(list(missing.values()))))
+            self.cache.put_many(fresh)
+            self._record_usage(count_tokens(list(missing.values())))
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [_text_key(t) for t in texts]
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        missing = self._missing(texts, keys, found)
+        if missing:
+            fresh = dict(zip(missing, await self.underlying.aembed_documents(list(missing.values()))))
+            await asyncio.to_thread(self.cache.put_many, fresh)
+            self._record_usage(await asyncio.to_thread(count_tokens, list(missing.values())))
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def _record_usage(self, tokens: int):
+        record_llm_usage(self.model, {"input_tokens": tokens, "output_tokens": 0})
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
@@ -1,19 +1,57 @@
-from langchain_openai import OpenAIEmbeddings
 from core.config import settings
+from core.embedding_cache import CachedEmbeddings, EmbeddingCache
+from core.metrics import register_stats
+import threading
 import structlog
 
 logger = structlog.get_logger()
 
 class EmbeddingClient:
     def __init__(self):
-        self.embeddings = OpenAIEmbeddings(
+        self._embeddings = None
+        self._build_lock = threading.Lock()
+        self.cache = None
+        if settings.embedding_cache_enabled:
+            self.cache = EmbeddingCache(
+                settings.embedding_cache_path,
+                namespace=f"{settings.embedding_model}:{settings.embedding_dimensions}",
+                max_memory_items=settings.embedding_cache_memory_items,
+            )
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._build_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._build()
+        return self._embeddings
+
+    def _build(self):
+        # imported on first use, like the chat client: langchain_openai is slow to import
+        from langchain_openai import OpenAIEmbeddings
+
+        embeddings = OpenAIEmbeddings(
             model=settings.embedding_model,
             dimensions=settings.embedding_dimensions,
             openai_api_key=settings.openai_api_key,
+            openai_api_base=settings.openai_base_url,
+            # compatible servers other than OpenAI generally take plain strings, not tiktoken ids
+            check_embedding_ctx_length=settings.openai_base_url is None,
         )
-    
+        if self.cache is not None:
+            embeddings = CachedEmbeddings(embeddings, self.cache, settings.embedding_model)
+        return embeddings
+
+    @embeddings.setter
+    def embeddings(self, value):
+        self._embeddings = value
+
     def get_embeddings(self):
         return self.embeddings
 
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache else {}
+
 # Singleton
-embedding_client = EmbeddingClient()
\ No newline at end of file
+embedding_client = EmbeddingClient()
+register_stats("embedding_cache", embedding_client.cache_stats)
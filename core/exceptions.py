@@ -14,4 +14,20 @@ class ValidationError(AppBaseException):
 
 class DatabaseError(AppBaseException):
     status_code = 500
-    code = "DB_ERROR"
\ No newline at end of file
+    code = "DB_ERROR"
+
+class NotFoundError(AppBaseException):
+    status_code = 404
+    code = "NOT_FOUND"
+
+class IngestCancelledError(AppBaseException):
+    status_code = 409
+    code = "INGEST_CANCELLED"
+
+class RateLimitedError(AppBaseException):
+    status_code = 429
+    code = "RATE_LIMITED"
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
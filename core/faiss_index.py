@@ -0,0 +1,229 @@
+from langchain_community.vectorstores import FAISS
+from core.config import settings
+import faiss
+import math
+import os
+import numpy as np
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def _nlist(n_vectors: int) -> int:
+    if settings.faiss_ivf_nlist:
+        return settings.faiss_ivf_nlist
+    # the usual rule of thumb, kept small enough that every list gets trained; at least two lists, since
+    # an IVF index with a single list is how flat shards are stored (see write_index)
+    return max(2, min(int(4 * math.sqrt(max(n_vectors, 1))), max(n_vectors // 39, 1)))
+
+
+def factory_string(index_type: str, dim: int, n_vectors: int = 0) -> str:
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{_nlist(n_vectors)},Flat"
+    if index_type == "ivf_pq":
+        if dim % settings.faiss_pq_m:
+            raise ValueError(f"faiss_pq_m={settings.faiss_pq_m} must divide the embedding dimension {dim}")
+        return f"IVF{_nlist(n_vectors)},PQ{settings.faiss_pq_m}x{settings.faiss_pq_nbits}"
+    if index_type == "hnsw":
+        return f"HNSW{settings.faiss_hnsw_m},Flat"
+    raise ValueError(f"unknown faiss_index_type {index_type!r}, expected one of {INDEX_TYPES}")
+
+
+def needs_training(index_type: str) -> bool:
+    return index_type in ("ivf_flat", "ivf_pq")
+
+
+def min_training_vectors(index_type: str, n_vectors: int = 0) -> int:
+    if not needs_training(index_type):
+        return 0
+    minimum = _nlist(n_vectors)
+    if index_type == "ivf_pq":
+        minimum = max(minimum, 2 ** settings.faiss_pq_nbits)
+    return minimum
+
+
+def _ivf(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    ivf = _ivf(index)
+    if ivf is None:
+        return "flat"
+    if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ):
+        return "ivf_pq"
+    # one inverted list holding every vector is scanned in full: an exact, flat index
+    return "flat" if ivf.nlist == 1 else "ivf_flat"
+
+
+def is_lossy(index) -> bool:
+    # PQ keeps codes, not vectors: what reconstruct returns only approximates what was added
+    return index_type_of(index) == "ivf_pq"
+
+
+def apply_search_params(index):
+    kind = index_type_of(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = settings.faiss_nprobe
+    elif kind == "hnsw":
+        index.hnsw.efSearch = settings.faiss_ef_search
+    return index
+
+
+def reconstruct_all(index) -> np.ndarray:
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    ivf = _ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def read_index(path: str, mmap: bool = True):
+    """Read an index file, memory-mapped read-only when possible so processes share it through the page cache.
+
+    faiss only memory-maps the inverted lists of IVF indexes; flat shards are written as IVF so they
+    qualify, but an HNSW index is read into each process's own memory.
+    """
+    if mmap:
+        try:
+            return apply_search_params(faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY))
+        except RuntimeError as e:
+            logger.warning("faiss_mmap_failed", path=path, error=str(e))
+    return apply_search_params(faiss.read_index(path))
+
+
+def _as_single_list_ivf(index):
+    # the same vectors in one inverted list: searches still scan all of them, but the file can be mmapped
+    quantizer = faiss.IndexFlat(index.d, index.metric_type)
+    quantizer.add(np.zeros((1, index.d), dtype=np.float32))
+    ivf = faiss.IndexIVFFlat(quantizer, index.d, 1, index.metric_type)
+    if index.ntotal:
+        ivf.add(index.reconstruct_n(0, index.ntotal))
+    return ivf
+
+
+def write_index(index, path: str):
+    if isinstance(index, faiss.IndexFlat):
+        index = _as_single_list_ivf(index)
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build_index(index_type: str, vectors: np.ndarray, dim: int):
+    """Create an index of `index_type`, training it on a sample of `vectors` when needed, and add them."""
+    index = faiss.index_factory(dim, factory_string(index_type, dim, len(vectors)))
+    if needs_training(index_type):
+        if len(vectors) < min_training_vectors(index_type, len(vectors)):
+            raise ValueError(f"{index_type} needs at least {min_training_vectors(index_type, len(vectors))} vectors to train")
+        sample = vectors
+        if len(vectors) > settings.faiss_train_sample_size:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), settings.faiss_train_sample_size, replace=False)]
+        index.train(sample)
+    if len(vectors):
+        index.add(vectors)
+    return apply_search_params(index)
+
+
+def migrate_index(vectorstore: FAISS, index_type: str, vectors: np.ndarray | None = None) -> bool:
+    """Rebuild the store's index as `index_type`, keeping vector positions so the docstore mapping stays valid.
+
+    `vectors` are the store's vectors in position order; by default they are read back from the index,
+    which for a lossy (PQ) index would carry its quantization error into the new one.
+    """
+    if index_type_of(vectorstore.index) == index_type:
+        return False
+    started = time.perf_counter()
+    vectors = reconstruct_all(vectorstore.index) if vectors is None else vectors
+    previous = index_type_of(vectorstore.index)
+    vectorstore.index = build_index(index_type, vectors, vectorstore.index.d)
+    logger.info(
+        "faiss_index_migrated",
+        from_type=previous,
+        to_type=index_type,
+        vectors=len(vectors),
+        seconds=round(time.perf_counter() - started, 3),
+    )
+    return True
+
+
+def delete_vectors(vectorstore: FAISS, ids: list[str], vectors: np.ndarray | None = None):
+    """Delete documents by id for any index type.
+
+    FAISS.delete relies on flat-index semantics (remove_ids compacts positions); IVF keeps the old
+    ids and HNSW cannot remove at all, so those are rebuilt from the remaining vectors instead,
+    reusing the already-trained index structure. `vectors` works as in `migrate_index`.
+    """
+    if isinstance(vectorstore.index, faiss.IndexFlat):
+        vectorstore.delete(ids)
+        return
+    doomed = set(ids)
+    mapping = vectorstore.index_to_docstore_id
+    keep = [pos for pos in sorted(mapping) if mapping[pos] not in doomed]
+    vectors = reconstruct_all(vectorstore.index) if vectors is None else vectors
+    index = faiss.clone_index(vectorstore.index)
+    index.reset()
+    if keep:
+        index.add(vectors[keep])
+    vectorstore.index = apply_search_params(index)
+    vectorstore.docstore.delete(list(doomed))
+    vectorstore.index_to_docstore_id = {i: mapping[pos] for i, pos in enumerate(keep)}
+
+
+def index_memory_bytes(index) -> int:
+    size = int(faiss.serialize_index(index).size)
+    ivf = _ivf(index)
+    if ivf is not None:
+        invlists = faiss.downcast_InvertedLists(ivf.invlists)
+        if isinstance(invlists, faiss.OnDiskInvertedLists):
+            # memory-mapped lists are left out of the serialized index: count their codes and ids
+            size += sum(invlists.list_size(i) * (invlists.code_size + 8) for i in range(invlists.nlist))
+    return size
+
+
+def index_report(vectors: np.ndarray, index_types=INDEX_TYPES, k: int = 6, n_queries: int = 200) -> list[dict]:
+    """Compare index types on the same vectors: build time, memory, search latency and recall@k vs. exact search."""
+    dim = vectors.shape[1]
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    exact = build_index("flat", vectors, dim)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        row = {"index_type": index_type}
+        try:
+            started = time.perf_counter()
+            index = build_index(index_type, vectors, dim)
+            row["build_s"] = round(time.perf_counter() - started, 3)
+        except ValueError as e:
+            rows.append({**row, "error": str(e)})
+            continue
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(queries):
+            started = time.perf_counter()
+            _, found[i : i + 1] = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        hits = sum(len(set(truth[i]) & set(found[i])) for i in range(len(queries)))
+        row.update(
+            memory_bytes=index_memory_bytes(index),
+            bytes_per_vector=round(index_memory_bytes(index) / max(len(vectors), 1), 1),
+            recall_at_k=round(hits / truth.size, 4),
+            p50_ms=round(float(np.percentile(latencies, 50)), 3),
+            p99_ms=round(float(np.percentile(latencies, 99)), 3),
+        )
+        rows.append(row)
+    return rows
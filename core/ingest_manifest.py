@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+import structlog
+
+logger = structlog.get_logger()
+
+
+def content_hash(data: bytes | str) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class IngestManifest:
+    """Tracks what has been embedded for each company so re-ingests only touch changed files.
+
+    Layout: {"version": 1, "companies": {company_id: {source: {"hash": ..., "chunks": {chunk_hash: vector_id}}}}}
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str | None, companies: dict | None = None):
+        self.path = path
+        self.companies: dict[str, dict[str, dict]] = companies or {}
+
+    @classmethod
+    def load(cls, path: str) -> "IngestManifest":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != cls.VERSION:
+                raise ValueError(f"unsupported manifest version {data.get('version')}")
+            return cls(path, data.get("companies", {}))
+        except FileNotFoundError:
+            return cls(path)
+        except Exception as e:
+            # a corrupt manifest only costs us a full re-embed, never a failed ingest
+            logger.warning("ingest_manifest_load_failed", path=path, error=str(e))
+            return cls(path)
+
+    def files(self, company_id: str) -> dict[str, dict]:
+        return self.companies.get(company_id, {})
+
+    def set_file(self, company_id: str, source: str, file_hash: str, chunks: dict[str, str]):
+        self.companies.setdefault(company_id, {})[source] = {"hash": file_hash, "chunks": chunks}
+
+    def remove_file(self, company_id: str, source: str):
+        self.companies.get(company_id, {}).pop(source, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.VERSION, "companies": self.companies}, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,149 @@
+from pydantic import BaseModel
+from typing import Awaitable, Callable
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+
+class _LeaderCancelled(Exception):
+    """The caller making a shared request was cancelled; whoever was waiting on it retries."""
+
+
+class LLMResponseCache:
+    """SQLite-backed cache of deterministic (temperature=0) LLM completions with TTL and size-bounded eviction.
+
+    Concurrent calls for the same key share one upstream request instead of each paying for it.
+    """
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "inflight_hits": 0, "misses": 0, "tokens_saved": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, usage TEXT, created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_input: str, output_schema: type[BaseModel]) -> str:
+        payload = json.dumps(
+            [model, system_prompt, user_input, output_schema.model_json_schema()],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get(self, key: str) -> tuple[str, dict | None] | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, usage, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] < now - self.ttl_seconds:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def _put(self, key: str, content: str, usage: dict | None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, content, usage, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                (key, content, json.dumps(usage) if usage else None, now, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            # least recently used rows go first once the table is over its cap
+            evicted = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._conn.commit()
+            self._stats["evictions"] += max(evicted, 0)
+
+    async def get_or_call(
+        self, key: str, call: Callable[[], Awaitable[tuple[str, dict | None]]]
+    ) -> tuple[str, dict | None, str]:
+        """Return ``(content, usage, source)`` where source is ``cache``, ``inflight`` or ``upstream``.
+
+        ``call`` should raise for responses that must not be cached (e.g. ones that fail to parse).
+        """
+        while True:
+            shared = await self._join_inflight(key)
+            if shared is not None:
+                return *shared, "inflight"
+
+            cached = await asyncio.to_thread(self._get, key)
+            if cached is not None:
+                self._record_hit("hits", cached[1])
+                return cached[0], cached[1], "cache"
+            # another caller may have started the same request while we were reading the table
+            if key not in self._inflight:
+                break
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._stats["misses"] += 1
+        try:
+            content, usage = await call()
+            future.set_result((content, usage))
+        except asyncio.CancelledError:
+            # the leader's cancellation is its own; waiters are told to go round and issue the call themselves
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody may be waiting on it; don't let asyncio warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        try:
+            await asyncio.to_thread(self._put, key, content, usage)
+        except Exception as e:
+            # a cache write failure must never fail the call that produced a good answer
+            logger.warning("llm_cache_write_failed", error=str(e))
+        return content, usage, "upstream"
+
+    async def _join_inflight(self, key: str) -> tuple[str, dict | None] | None:
+        """Wait for a request already in flight for `key`; None if there is none or its caller was cancelled."""
+        future = self._inflight.get(key)
+        if future is None:
+            return None
+        try:
+            content, usage = await asyncio.shield(future)
+        except _LeaderCancelled:
+            return None
+        self._record_hit("inflight_hits", usage)
+        return content, usage
+
+    def _record_hit(self, kind: str, usage: dict | None):
+        self._stats[kind] += 1
+        self._stats["tokens_saved"] += (usage or {}).get("total_tokens", 0)
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + self._stats["inflight_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        return {**self._stats, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
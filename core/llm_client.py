@@ -1,34 +1,244 @@
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from pydantic import BaseModel
 from core.config import settings
-from core.exceptions import LLMError
-from tenacity import retry, stop_after_attempt, wait_exponential
+from core.exceptions import LLMError, RateLimitedError
+from core.llm_cache import LLMResponseCache
+from core.metrics import record_cache, record_llm_usage, record_retry, register_stats, timed
+from core.rate_limiter import rate_limiter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+import asyncio
+import math
+import threading
+import time
 import structlog
 
+if TYPE_CHECKING:
+    import openai
+    from langchain_core.output_parsers import PydanticOutputParser
+
 logger = structlog.get_logger()
 
+@dataclass
+class CallStats:
+    """Retries and token usage of every LLM call made inside a `track_calls()` block."""
+    calls: int = 0
+    retries: int = 0
+    tokens: dict = field(default_factory=lambda: {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0})
+
+    def record_usage(self, usage: dict | None):
+        self.calls += 1
+        for key in self.tokens:
+            self.tokens[key] += (usage or {}).get(key, 0)
+
+_call_stats: ContextVar[CallStats | None] = ContextVar("llm_call_stats", default=None)
+
+@contextmanager
+def track_calls() -> Iterator[CallStats]:
+    # contextvars are copied per asyncio task, so concurrent steps each see only their own calls
+    stats = CallStats()
+    token = _call_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _call_stats.reset(token)
+
+def _record_retry(retry_state):
+    record_retry()
+    stats = _call_stats.get()
+    if stats is not None:
+        stats.retries += 1
+
+def _record_usage(usage: dict | None):
+    record_llm_usage(settings.llm.model, usage)
+    stats = _call_stats.get()
+    if stats is not None:
+        stats.record_usage(usage)
+
+def _estimate_tokens(messages: list[BaseMessage]) -> int:
+    # ~4 characters per token, plus room for the completion; settled against real usage afterwards
+    return sum(len(str(m.content)) for m in messages) // 4 + settings.rate_limit_output_tokens
+
+def _retry_after(error: "openai.RateLimitError") -> float:
+    try:
+        return float(error.response.headers.get("retry-after", 1))
+    except (AttributeError, TypeError, ValueError):
+        return 1.0
+
+def _is_retryable(error: BaseException) -> bool:
+    # the SDK already backed off on provider 429s; retrying those here only adds to the burst
+    return not isinstance(error, RateLimitedError)
+
 class LLMClient:
+    """Process-wide chat client: one pooled HTTP connection set and one rate limiter for every service."""
+
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=settings.llm.model,
-            temperature=0,
-            api_key=settings.openai_api_key,
-        )
+        self.http_client = None
+        self._llm = None
+        # the warm-up builds in a thread while requests may already be asking for the client
+        self._build_lock = threading.Lock()
+        self.limiter = rate_limiter
+        self.cache = None
+        if settings.response_cache_enabled:
+            self.cache = LLMResponseCache(
+                settings.response_cache_path,
+                ttl_seconds=settings.response_cache_ttl_seconds,
+                max_entries=settings.response_cache_max_entries,
+            )
+            register_stats("llm_response_cache", self.cache.stats)
+
+    def _build(self):
+        # deferred to first use: langchain_openai and the openai SDK take about a second to import
+        with self._build_lock:
+            if self._llm is not None:
+                return
+            import httpx
+            from langchain_openai import ChatOpenAI
+
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.openai_max_connections,
+                    max_keepalive_connections=settings.openai_max_keepalive_connections,
+                ),
+                timeout=settings.openai_timeout_seconds,
+            )
+            self._llm = ChatOpenAI(
+                model=settings.llm.model,
+                temperature=0,
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url,
+                http_async_client=self.http_client,
+                max_retries=settings.openai_max_retries,
+                # report token usage on streamed responses too
+                stream_usage=True,
+            )
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            self._build()
+        return self._llm
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=10))
+    @llm.setter
+    def llm(self, value):
+        self._llm = value
+
+    async def warm_up(self):
+        """Build the client and open a pooled connection to the API so the first call skips connection setup."""
+        if self._llm is None:
+            # imports in a thread, so the event loop keeps answering (e.g. /ready) meanwhile
+            await asyncio.to_thread(self._build)
+        if self.http_client is None:
+            # a model swapped in from outside brings its own transport
+            return
+        base_url = (settings.openai_base_url or "https://api.openai.com/v1").rstrip("/")
+        started = time.perf_counter()
+        try:
+            # listing models is free and authenticated, so a bad key also shows up in the startup log
+            response = await self.http_client.get(
+                f"{base_url}/models", headers={"Authorization": f"Bearer {settings.openai_api_key}"}
+            )
+            logger.info("llm_pool_primed", status=response.status_code, seconds=round(time.perf_counter() - started, 3))
+        except Exception as e:
+            logger.warning("llm_pool_prime_failed", error=str(e))
+
+    def _provider_limited(self, error: "openai.RateLimitError") -> RateLimitedError:
+        retry_after = _retry_after(error)
+        self.limiter.pause(retry_after)
+        record_llm_usage(settings.llm.model, None, status="rate_limited")
+        return RateLimitedError("LLM provider rate limit reached, retry later", retry_after=math.ceil(retry_after))
+
+    async def _ainvoke(self, messages: list[BaseMessage]):
+        from openai import RateLimitError
+
+        async with self.limiter.slot(_estimate_tokens(messages)) as reservation:
+            with timed("llm", "completion"):
+                try:
+                    response = await self.llm.ainvoke(messages)
+                except RateLimitError as e:
+                    raise self._provider_limited(e) from e
+                except Exception:
+                    record_llm_usage(settings.llm.model, None, status="error")
+                    raise
+            reservation.settle((response.usage_metadata or {}).get("total_tokens"))
+        _record_usage(response.usage_metadata)
+        return response
+
+    async def _complete_parsed(self, messages: list[BaseMessage], parser: "PydanticOutputParser") -> tuple[str, dict | None]:
+        response = await self._ainvoke(messages)
+        # parse before returning so an unparseable completion never lands in the cache
+        parser.parse(response.content)
+        return response.content, response.usage_metadata
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        retry=retry_if_exception(_is_retryable),
+        before_sleep=_record_retry,
+        reraise=True,
+    )
     async def structured_call(self, system_prompt: str, user_input: str, output_schema: type[BaseModel]) -> BaseModel:
+        # pulls in langchain_core.language_models, the bulk of langchain_core's import time
+        from langchain_core.output_parsers import PydanticOutputParser
+
         parser = PydanticOutputParser(pydantic_object=output_schema)
         messages = [
             SystemMessage(content=system_prompt + "\n\n" + parser.get_format_instructions()),
             HumanMessage(content=user_input)
         ]
         try:
-            response = await self.llm.ainvoke(messages)
-            parsed = parser.parse(response.content)
-            logger.info("llm_structured_call_success", model=settings.llm.model, tokens=response.usage_metadata)
+            cache_fields = {}
+            if self.cache is None:
+                content, usage = await self._complete_parsed(messages, parser)
+            else:
+                key = LLMResponseCache.make_key(settings.llm.model, system_prompt, user_input, output_schema)
+                content, usage, source = await self.cache.get_or_call(key, lambda: self._complete_parsed(messages, parser))
+                record_cache("llm_response", "miss" if source == "upstream" else "hit")
+                stats = self.cache.stats()
+                cache_fields = {
+                    "cache": source,
+                    "cache_hit_rate": stats["hit_rate"],
+                    "tokens_saved": (usage or {}).get("total_tokens", 0) if source != "upstream" else 0,
+                    "tokens_saved_total": stats["tokens_saved"],
+                }
+            parsed = parser.parse(content)
+            logger.info("llm_structured_call_success", model=settings.llm.model, tokens=usage, **cache_fields)
             return parsed
+        except RateLimitedError:
+            raise
         except Exception as e:
             logger.error("llm_call_failed", error=str(e))
-            raise LLMError(f"LLM call failed: {str(e)}")
\ No newline at end of file
+            raise LLMError(f"LLM call failed: {str(e)}")
+
+    async def invoke(self, messages: list[BaseMessage]):
+        return await self._ainvoke(messages)
+
+    async def stream(self, messages: list[BaseMessage]) -> AsyncIterator:
+        """Yield chunks from the model; usage arrives with the last chunk and is recorded once the stream ends."""
+        from openai import RateLimitError
+
+        usage = None
+        async with self.limiter.slot(_estimate_tokens(messages)) as reservation:
+            with timed("llm", "stream"):
+                try:
+                    async for chunk in self.llm.astream(messages):
+                        usage = chunk.usage_metadata or usage
+                        yield chunk
+                except RateLimitError as e:
+                    raise self._provider_limited(e) from e
+                except Exception:
+                    record_llm_usage(settings.llm.model, None, status="error")
+                    raise
+            reservation.settle((usage or {}).get("total_tokens"))
+        _record_usage(usage)
+
+    async def aclose(self):
+        if self.http_client is not None:
+            await self.http_client.aclose()
+
+# Singleton shared by the workflow and RAG services
+llm_client = LLMClient()
+register_stats("rate_limiter", rate_limiter.stats)
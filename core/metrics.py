@@ -0,0 +1,107 @@
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+import os
+import re
+import time
+
+# USD per 1M input / output tokens; models not listed are counted with zero cost
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-ada-002": (0.10, 0.0),
+}
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to response headers per route", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "app_stage_duration_seconds", "Latency of one stage of request handling", ["component", "stage"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM API", ["model", "endpoint", "kind"])
+LLM_COST = Counter("llm_cost_usd_total", "Estimated LLM spend from MODEL_PRICES", ["model", "endpoint"])
+LLM_CALLS = Counter("llm_calls_total", "LLM API calls by outcome", ["model", "endpoint", "status"])
+LLM_RETRIES = Counter("llm_retries_total", "LLM calls retried after a failure", ["endpoint"])
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+QUERY_EMBED_BATCH_SIZE = Histogram(
+    "query_embedding_batch_size", "Queries embedded per coalesced API call", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+QUERY_EMBED_QUEUE_DELAY = Histogram(
+    "query_embedding_queue_delay_seconds", "Time a query waited for its batch to be sent",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+
+# route of the request being served, so LLM usage can be attributed to the endpoint that caused it
+current_endpoint: ContextVar[str] = ContextVar("current_endpoint", default="none")
+
+_stats_sources: dict[str, Callable[[], dict]] = {}
+
+
+@contextmanager
+def timed(component: str, stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(component, stage).observe(time.perf_counter() - started)
+
+
+def record_llm_usage(model: str, usage: dict | None, status: str = "ok"):
+    endpoint = current_endpoint.get()
+    LLM_CALLS.labels(model, endpoint, status).inc()
+    if not usage:
+        return
+    input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    LLM_TOKENS.labels(model, endpoint, "input").inc(input_tokens)
+    LLM_TOKENS.labels(model, endpoint, "output").inc(output_tokens)
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    LLM_COST.labels(model, endpoint).inc((input_tokens * input_price + output_tokens * output_price) / 1_000_000)
+
+
+def record_retry():
+    LLM_RETRIES.labels(current_endpoint.get()).inc()
+
+
+def record_cache(cache: str, result: str):
+    CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def register_stats(name: str, source: Callable[[], dict]):
+    """Expose the numeric values of `source()` as ``app_<name>_<key>`` gauges, read only at scrape time."""
+    _stats_sources[name] = source
+
+
+class _StatsCollector:
+    def collect(self):
+        for name, source in list(_stats_sources.items()):
+            try:
+                stats = source()
+            except Exception:
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"app_{name}_{key}")
+                    yield GaugeMetricFamily(metric, f"{name} {key}", value=value)
+
+
+REGISTRY.register(_StatsCollector())
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # one uvicorn worker answers the scrape; aggregate what every worker wrote
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_StatsCollector())
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
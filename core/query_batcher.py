@@ -0,0 +1,94 @@
+from core.config import settings
+from core.embedding_client import embedding_client
+from core.metrics import QUERY_EMBED_BATCH_SIZE, QUERY_EMBED_QUEUE_DELAY, register_stats
+import asyncio
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+
+class QueryEmbeddingBatcher:
+    """Coalesces query embeddings from concurrent requests into one batched API call.
+
+    The first query to arrive opens a window of `window_ms`; everything queued by the time it closes
+    (or once `max_batch` queries are waiting) goes out as a single `aembed_documents` request and each
+    caller gets its own vector back. A window of 0 embeds every query on its own.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max(max_batch, 1)
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._sending: set[asyncio.Task] = set()
+        self._stats = {"queries": 0, "batches": 0, "failed_batches": 0, "max_batch_seen": 0}
+
+    async def embed(self, text: str) -> list[float]:
+        if self.window <= 0:
+            self._record(1, [0.0])
+            return await embedding_client.get_embeddings().aembed_query(text)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[: self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            # more than one batch was queued: start the next window straight away
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future, float]]):
+        sent_at = time.perf_counter()
+        self._record(len(batch), [sent_at - queued_at for _, _, queued_at in batch])
+        # identical queries in one window cost a single embedding
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = dict(zip(texts, await embedding_client.get_embeddings().aembed_documents(texts)))
+        except Exception as e:
+            self._stats["failed_batches"] += 1
+            logger.warning("query_embedding_batch_failed", size=len(batch), error=str(e))
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future, _ in batch:
+            # a caller that was cancelled while waiting no longer wants its vector
+            if not future.done():
+                future.set_result(vectors[text])
+
+    def _record(self, size: int, delays: list[float]):
+        self._stats["queries"] += size
+        self._stats["batches"] += 1
+        self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], size)
+        QUERY_EMBED_BATCH_SIZE.observe(size)
+        for delay in delays:
+            QUERY_EMBED_QUEUE_DELAY.observe(delay)
+
+    def stats(self) -> dict:
+        batches = self._stats["batches"]
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "avg_batch_size": round(self._stats["queries"] / batches, 2) if batches else 0.0,
+        }
+
+
+query_embedder = QueryEmbeddingBatcher(
+    window_ms=settings.query_embed_window_ms,
+    max_batch=settings.query_embed_max_batch,
+)
+register_stats("query_embedder", query_embedder.stats)
@@ -0,0 +1,143 @@
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from core.config import settings
+from core.exceptions import RateLimitedError
+from typing import AsyncIterator, Iterator
+import asyncio
+import math
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+# background work (bulk lead batches) waits for capacity instead of being rejected
+_patient: ContextVar[bool] = ContextVar("rate_limit_patient", default=False)
+
+
+@contextmanager
+def patient() -> Iterator[None]:
+    token = _patient.set(True)
+    try:
+        yield
+    finally:
+        _patient.reset(token)
+
+
+class _Bucket:
+    """Token bucket that may go negative: a reservation is taken immediately and the caller sleeps off the debt."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Debit `amount` and return the seconds until the bucket is back to zero."""
+        self._refill(now)
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Reservation:
+    def __init__(self, limiter: "RateLimiter", tokens: int):
+        self._limiter = limiter
+        self.tokens = tokens
+
+    def settle(self, actual_tokens: int | None):
+        # correct the up-front estimate once the provider reports real usage
+        if actual_tokens and self._limiter._tokens is not None:
+            self._limiter._tokens.refund(self.tokens - actual_tokens)
+            self.tokens = actual_tokens
+
+
+class RateLimiter:
+    """Process-wide requests/minute and tokens/minute buckets plus a cap on calls in flight.
+
+    Callers that would have to wait longer than `max_wait_seconds` are rejected straight away with
+    RateLimitedError (and a Retry-After hint) instead of queueing behind everyone else.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int, max_wait_seconds: float):
+        self._requests = _Bucket(rpm) if rpm else None
+        self._tokens = _Bucket(tpm) if tpm else None
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.max_wait_seconds = max_wait_seconds
+        self._paused_until = 0.0
+        self._stats = {"acquired": 0, "rejected": 0, "waiting": 0, "in_flight": 0, "waited_seconds": 0.0, "provider_pauses": 0}
+
+    def _reserve(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait = max(0.0, self._paused_until - now)
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1, now))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens, now))
+        return wait
+
+    def _refund(self, tokens: int):
+        if self._requests is not None:
+            self._requests.refund(1)
+        if self._tokens is not None:
+            self._tokens.refund(tokens)
+
+    def _reject(self, tokens: int, retry_after: float):
+        self._refund(tokens)
+        self._stats["rejected"] += 1
+        logger.warning("llm_rate_limited", retry_after=round(retry_after, 2), **self.stats())
+        raise RateLimitedError("LLM capacity exhausted, retry later", retry_after=math.ceil(retry_after))
+
+    @asynccontextmanager
+    async def slot(self, tokens: int) -> AsyncIterator[Reservation]:
+        max_wait = None if _patient.get() else self.max_wait_seconds
+        wait = self._reserve(tokens)
+        if max_wait is not None and wait > max_wait:
+            self._reject(tokens, wait)
+
+        started = time.monotonic()
+        self._stats["waiting"] += 1
+        try:
+            if wait:
+                await asyncio.sleep(wait)
+            if self._slots is not None:
+                remaining = None if max_wait is None else max(max_wait - wait, 0.0)
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), remaining)
+                except asyncio.TimeoutError:
+                    self._reject(tokens, max(self.max_wait_seconds, 1.0))
+        except BaseException:
+            self._stats["waiting"] -= 1
+            raise
+        self._stats["waiting"] -= 1
+        self._stats["waited_seconds"] += time.monotonic() - started
+        self._stats["acquired"] += 1
+        self._stats["in_flight"] += 1
+        try:
+            yield Reservation(self, tokens)
+        finally:
+            self._stats["in_flight"] -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def pause(self, seconds: float):
+        """Hold back every caller after the provider itself answered 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._stats["provider_pauses"] += 1
+
+    def stats(self) -> dict:
+        return {**self._stats, "waited_seconds": round(self._stats["waited_seconds"], 3)}
+
+
+rate_limiter = RateLimiter(
+    rpm=settings.rate_limit_rpm,
+    tpm=settings.rate_limit_tpm,
+    max_concurrency=settings.rate_limit_max_concurrency,
+    max_wait_seconds=settings.rate_limit_max_wait_seconds,
+)
@@ -1,36 +1,345 @@
+from collections import OrderedDict
 from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from core.doc_store import PositionMap, SQLiteDocstore
 from core.embedding_client import embedding_client
+from core.ingest_manifest import IngestManifest
 from core.config import settings
+from core.exceptions import ValidationError
+from core.metrics import timed
+from core.faiss_index import (
+    build_index, delete_vectors, index_type_of, is_lossy, migrate_index, min_training_vectors, needs_training, read_index,
+    reconstruct_all, write_index,
+)
+from typing import Callable
+from uuid import uuid4
+import numpy as np
 import os
+import re
+import shutil
+import threading
+import time
 import structlog
 
 logger = structlog.get_logger()
 
+# no leading '.', so neither '.' nor '..' can name a shard
+COMPANY_ID_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,127}")
+
 class VectorStoreManager:
-    _vectorstore = None
-    
+    """Per-company FAISS shards stored as immutable generations.
+
+    Layout: ``<shard>/generations/<generation>/{index.faiss, docstore.sqlite, manifest.json}`` plus a
+    ``CURRENT`` file naming the live generation. Writers work on a private copy (`checkout`) and
+    `publish` it as a new generation by atomically replacing ``CURRENT``; searches already running
+    finish on the store object they hold, the next one gets the new generation.
+    """
+
+    # one FAISS index per company_id, most recently used last
+    _shards: OrderedDict[str, FAISS] = OrderedDict()
+    # (inode, mtime) of the CURRENT file each loaded shard was read from, to notice publishes by other processes
+    _stamps: dict[str, tuple[int, int] | None] = {}
+    _listeners: list[Callable[[str], None]] = []
+    _lock = threading.RLock()
+
+    @staticmethod
+    def validate_company_id(company_id: str) -> str:
+        # used as a directory name as-is: rewriting it would map different tenants to one shard
+        if not COMPANY_ID_PATTERN.fullmatch(company_id):
+            raise ValidationError(
+                f"Invalid company_id {company_id!r}: use letters, digits, '_', '-' or '.', starting with a letter or digit"
+            )
+        return company_id
+
+    @classmethod
+    def shard_path(cls, company_id: str) -> str:
+        return os.path.join(settings.faiss_index_path, "shards", cls.validate_company_id(company_id))
+
+    @classmethod
+    def generation_path(cls, company_id: str, generation: str) -> str:
+        return os.path.join(cls.shard_path(company_id), "generations", generation)
+
+    @classmethod
+    def current_generation(cls, company_id: str) -> str | None:
+        try:
+            with open(os.path.join(cls.shard_path(company_id), "CURRENT"), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def generations(cls, company_id: str) -> list[str]:
+        """Complete generations on disk, oldest first (names sort by creation time)."""
+        path = os.path.join(cls.shard_path(company_id), "generations")
+        if not os.path.isdir(path):
+            return []
+        # the manifest is written last, so a generation still being published is not listed
+        return sorted(g for g in os.listdir(path) if os.path.exists(os.path.join(path, g, "manifest.json")))
+
     @classmethod
-    def get_vectorstore(cls):
-        if cls._vectorstore is None:
-            index_path = settings.faiss_index_path
+    def _stamp(cls, company_id: str) -> tuple[int, int] | None:
+        try:
+            stat = os.stat(os.path.join(cls.shard_path(company_id), "CURRENT"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    @classmethod
+    def on_generation_change(cls, callback: Callable[[str], None]):
+        """Call `callback(company_id)` whenever a different generation of that shard goes live."""
+        cls._listeners.append(callback)
+
+    @classmethod
+    def _notify(cls, company_id: str):
+        for callback in cls._listeners:
+            callback(company_id)
+
+    @classmethod
+    def get_vectorstore(cls, company_id: str) -> FAISS:
+        """Return the company's live shard. It must not be modified; use `checkout` and `publish` for that."""
+        with cls._lock:
+            if company_id in cls._shards:
+                if cls._stamps.get(company_id) == cls._stamp(company_id):
+                    cls._shards.move_to_end(company_id)
+                    return cls._shards[company_id]
+                # another process published or rolled back since this shard was loaded
+                cls._shards.pop(company_id)
+                cls._notify(company_id)
+
+            with timed("vector_store", "load_shard"):
+                vectorstore = cls._load_shard(company_id)
+            cls._shards[company_id] = vectorstore
+            while len(cls._shards) > settings.faiss_max_loaded_shards:
+                evicted, _ = cls._shards.popitem(last=False)
+                cls._stamps.pop(evicted, None)
+                logger.info("faiss_shard_evicted", company_id=evicted)
+            return vectorstore
+
+    @classmethod
+    def _load_shard(cls, company_id: str) -> FAISS:
+        cls._adopt_unversioned_layout(company_id)
+        if cls.current_generation(company_id) is None:
+            cls._migrate_legacy_index(company_id)
+
+        cls._stamps[company_id] = cls._stamp(company_id)
+        generation = cls.current_generation(company_id)
+        if generation is not None:
             try:
-                # attempt to load any existing index; if it fails we fall back to creation
-                cls._vectorstore = FAISS.load_local(
-                    index_path,
-                    embedding_client.get_embeddings(),
-                    allow_dangerous_deserialization=True,
+                vectorstore = cls._open_generation(company_id, generation)
+                logger.info(
+                    "faiss_shard_loaded",
+                    company_id=company_id,
+                    generation=generation,
+                    vectors=vectorstore.index.ntotal,
+                    index_type=index_type_of(vectorstore.index),
                 )
-                logger.info("faiss_index_loaded")
+                return vectorstore
             except Exception as e:
-                logger.warning("faiss_load_failed", error=str(e))
-                # create a fresh (empty) index and persist it
-                cls._vectorstore = FAISS.from_texts([""], embedding_client.get_embeddings())
-                cls._vectorstore.save_local(index_path)
-                logger.info("faiss_index_created_empty")
-        return cls._vectorstore
+                logger.warning("faiss_load_failed", company_id=company_id, generation=generation, error=str(e))
+
+        logger.info("faiss_shard_created_empty", company_id=company_id)
+        return cls._empty_store()
 
     @classmethod
-    def save(cls):
-        if cls._vectorstore:
-            cls._vectorstore.save_local(settings.faiss_index_path)
\ No newline at end of file
+    def _open_generation(cls, company_id: str, generation: str, mmap: bool = True) -> FAISS:
+        path = cls.generation_path(company_id, generation)
+        docstore = SQLiteDocstore(os.path.join(path, "docstore.sqlite"))
+        index = read_index(os.path.join(path, "index.faiss"), mmap=mmap)
+        return FAISS(embedding_client.get_embeddings(), index, docstore, PositionMap(docstore))
+
+    @staticmethod
+    def _empty_store() -> FAISS:
+        # index types that need training start out flat and are migrated once there is enough data
+        index_type = "flat" if needs_training(settings.faiss_index_type) else settings.faiss_index_type
+        return FAISS(
+            embedding_client.get_embeddings(),
+            build_index(index_type, np.empty((0, settings.embedding_dimensions), dtype=np.float32), settings.embedding_dimensions),
+            SQLiteDocstore(),
+            {},
+        )
+
+    @classmethod
+    def checkout(cls, company_id: str) -> tuple[FAISS, IngestManifest]:
+        """A private, writable copy of the live generation and its manifest, for building the next one."""
+        cls.get_vectorstore(company_id)
+        generation = cls.current_generation(company_id)
+        if generation is None:
+            return cls._empty_store(), IngestManifest(None)
+        path = cls.generation_path(company_id, generation)
+        # read into memory: a memory-mapped index is read-only and writing to it would abort the process
+        vectorstore = cls._open_generation(company_id, generation, mmap=False)
+        return vectorstore, IngestManifest.load(os.path.join(path, "manifest.json"))
+
+    @classmethod
+    def publish(cls, company_id: str, vectorstore: FAISS, manifest: IngestManifest | None = None) -> str:
+        """Write `vectorstore` as a new generation, make it live and garbage-collect old generations."""
+        generation = cls._new_generation_name()
+        path = cls.generation_path(company_id, generation)
+        os.makedirs(path)
+        with timed("vector_store", "save"):
+            write_index(vectorstore.index, os.path.join(path, "index.faiss"))
+            vectorstore.docstore.write(os.path.join(path, "docstore.sqlite"), vectorstore.index_to_docstore_id)
+            manifest = manifest or IngestManifest(None)
+            manifest.path = os.path.join(path, "manifest.json")
+            manifest.save()
+        vectorstore.index_to_docstore_id = PositionMap(vectorstore.docstore)
+
+        cls._activate(company_id, generation)
+        logger.info("faiss_generation_published", company_id=company_id, generation=generation, vectors=vectorstore.index.ntotal)
+        cls.collect_garbage(company_id)
+        return generation
+
+    @staticmethod
+    def _new_generation_name(suffix: str | None = None) -> str:
+        ns = time.time_ns()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(ns // 1_000_000_000))
+        return f"{stamp}.{ns % 1_000_000_000:09d}-{suffix or uuid4().hex[:6]}"
+
+    @classmethod
+    def rollback(cls, company_id: str, generation: str | None = None) -> str:
+        """Make `generation` (default: the one before the live generation) live again."""
+        available = cls.generations(company_id)
+        current = cls.current_generation(company_id)
+        if generation is None:
+            older = [g for g in available if current is None or g < current]
+            if not older:
+                raise ValueError(f"No generation older than {current} to roll back to")
+            generation = older[-1]
+        elif generation not in available:
+            raise ValueError(f"Unknown generation {generation}; available: {', '.join(available) or 'none'}")
+        cls._activate(company_id, generation)
+        logger.warning("faiss_generation_rolled_back", company_id=company_id, generation=generation, previous=current)
+        return generation
+
+    @classmethod
+    def _activate(cls, company_id: str, generation: str):
+        current_path = os.path.join(cls.shard_path(company_id), "CURRENT")
+        tmp_path = f"{current_path}.{uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generation)
+            f.flush()
+            os.fsync(f.fileno())
+        # the swap is a single rename: readers see either the old or the new generation, never a mix
+        os.replace(tmp_path, current_path)
+        if company_id in cls._shards:
+            # opened before taking the lock, so searches keep using the old generation until the swap
+            vectorstore = cls._open_generation(company_id, generation)
+            with cls._lock:
+                cls._shards[company_id] = vectorstore
+                cls._stamps[company_id] = cls._stamp(company_id)
+        cls._notify(company_id)
+
+    @classmethod
+    def collect_garbage(cls, company_id: str, keep: int | None = None) -> list[str]:
+        """Delete all but the newest `keep` generations, never the live one."""
+        keep = settings.faiss_keep_generations if keep is None else keep
+        current = cls.current_generation(company_id)
+        available = cls.generations(company_id)
+        doomed = [g for g in available[: max(len(available) - keep, 0)] if g != current]
+        for generation in doomed:
+            # processes still searching an old generation keep their open files until they reload
+            shutil.rmtree(cls.generation_path(company_id, generation), ignore_errors=True)
+        if doomed:
+            logger.info("faiss_generations_collected", company_id=company_id, removed=len(doomed), kept=len(available) - len(doomed))
+        return doomed
+
+    @classmethod
+    def _adopt_unversioned_layout(cls, company_id: str):
+        # shards written before generations kept index.faiss / docstore.sqlite / manifest.json at the top level
+        path = cls.shard_path(company_id)
+        if cls.current_generation(company_id) is not None:
+            return
+        if os.path.exists(os.path.join(path, "index.pkl")):
+            cls._convert_pickle_docstore(company_id)
+        if not (os.path.exists(os.path.join(path, "index.faiss")) and os.path.exists(os.path.join(path, "docstore.sqlite"))):
+            return
+        generation = cls._new_generation_name("adopted")
+        target = cls.generation_path(company_id, generation)
+        os.makedirs(target, exist_ok=True)
+        for name in ("index.faiss", "docstore.sqlite", "manifest.json"):
+            if os.path.exists(os.path.join(path, name)):
+                os.replace(os.path.join(path, name), os.path.join(target, name))
+        if not os.path.exists(os.path.join(target, "manifest.json")):
+            IngestManifest(os.path.join(target, "manifest.json")).save()
+        cls._activate(company_id, generation)
+        logger.info("faiss_shard_versioned", company_id=company_id, generation=generation)
+
+    @classmethod
+    def _convert_pickle_docstore(cls, company_id: str):
+        # shards saved by FAISS.save_local keep the docstore in index.pkl; move it into SQLite once
+        path = cls.shard_path(company_id)
+        try:
+            legacy = FAISS.load_local(path, embedding_client.get_embeddings(), allow_dangerous_deserialization=True)
+        except Exception as e:
+            logger.warning("faiss_pickle_load_failed", company_id=company_id, error=str(e))
+            return
+        docstore = SQLiteDocstore()
+        docstore.add({doc_id: legacy.docstore.search(doc_id) for doc_id in legacy.index_to_docstore_id.values()})
+        docstore.write(os.path.join(path, "docstore.sqlite"), legacy.index_to_docstore_id)
+        os.remove(os.path.join(path, "index.pkl"))
+        logger.info("faiss_docstore_converted", company_id=company_id, documents=len(legacy.index_to_docstore_id))
+
+    @classmethod
+    def ensure_index_type(cls, vectorstore: FAISS, index_type: str | None = None) -> bool:
+        """Migrate the store to the configured index type once it holds enough vectors to train it."""
+        index_type = index_type or settings.faiss_index_type
+        if index_type_of(vectorstore.index) == index_type:
+            return False
+        if vectorstore.index.ntotal < min_training_vectors(index_type, vectorstore.index.ntotal):
+            return False
+        with timed("vector_store", "migrate_index"):
+            return migrate_index(vectorstore, index_type, cls.exact_vectors(vectorstore) if is_lossy(vectorstore.index) else None)
+
+    @classmethod
+    def delete_vectors(cls, vectorstore: FAISS, ids: list[str]):
+        with timed("vector_store", "delete_vectors"):
+            delete_vectors(vectorstore, ids, cls.exact_vectors(vectorstore) if is_lossy(vectorstore.index) else None)
+
+    @staticmethod
+    def exact_vectors(vectorstore: FAISS) -> np.ndarray:
+        """The store's vectors in position order, as they were embedded rather than as the index encodes them.
+
+        A PQ index only keeps approximations, and rebuilding from those would compound the error with every
+        delete or migration, so its chunks are embedded again (served by the embedding cache when enabled).
+        """
+        if not is_lossy(vectorstore.index):
+            return reconstruct_all(vectorstore.index)
+        mapping = vectorstore.index_to_docstore_id
+        texts = [vectorstore.docstore.search(mapping[position]).page_content for position in range(vectorstore.index.ntotal)]
+        logger.info("faiss_pq_reembedding", vectors=len(texts))
+        with timed("vector_store", "reembed"):
+            vectors = embedding_client.get_embeddings().embed_documents(texts) if texts else []
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), vectorstore.index.d)
+
+    @classmethod
+    def _migrate_legacy_index(cls, company_id: str):
+        # carve this company's vectors out of the old single global index, if there is one
+        legacy_path = settings.faiss_index_path
+        if not os.path.exists(os.path.join(legacy_path, "index.faiss")):
+            return
+        try:
+            legacy = FAISS.load_local(
+                legacy_path,
+                embedding_client.get_embeddings(),
+                allow_dangerous_deserialization=True,
+            )
+        except Exception as e:
+            logger.warning("faiss_legacy_load_failed", error=str(e))
+            return
+
+        text_embeddings, metadatas, ids = [], [], []
+        for position, doc_id in legacy.index_to_docstore_id.items():
+            doc = legacy.docstore.search(doc_id)
+            if getattr(doc, "metadata", {}).get("company_id") != company_id:
+                continue
+            text_embeddings.append((doc.page_content, legacy.index.reconstruct(position).tolist()))
+            metadatas.append(doc.metadata)
+            ids.append(doc_id)
+        if not ids:
+            return
+
+        vectorstore = cls._empty_store()
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        # the old global manifest described exactly these vector ids
+        legacy_manifest = IngestManifest.load(os.path.join(legacy_path, "manifest.json"))
+        cls.publish(company_id, vectorstore, IngestManifest(None, {company_id: legacy_manifest.files(company_id)}))
+        logger.info("faiss_shard_migrated", company_id=company_id, vectors=len(ids))
@@ -0,0 +1,169 @@
+from sqlmodel import SQLModel
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.metrics import STAGE_LATENCY, register_stats, timed
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential
+import asyncio
+import time
+import structlog
+
+logger = structlog.get_logger()
+
+
+class WriteBehindWriter:
+    """Single background task that drains queued rows and commits them in batched transactions.
+
+    The queue is bounded: when it is full, `put()` waits for the writer to catch up instead of
+    letting memory grow, which pushes back on the request handlers producing rows. A batch whose
+    commit keeps failing is retried with backoff, then committed row by row so one bad row only
+    drops itself; dropped rows are logged as `write_behind_row_dropped`.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int, flush_interval_ms: int, max_attempts: int):
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.flush_interval = flush_interval_ms / 1000
+        self._max_queue = max_queue
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._in_flight = 0
+        self._stats = {
+            "flushed_rows": 0,
+            "failed_rows": 0,
+            "row_fallbacks": 0,
+            "flushes": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "backpressure_waits": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self._max_queue)
+        self._task = asyncio.create_task(self._run(), name="write-behind")
+        logger.info("write_behind_started", max_queue=self._max_queue, batch_size=self.batch_size)
+
+    async def stop(self):
+        if not self.running:
+            return
+        # a sentinel behind everything already queued: the writer drains the queue, then exits
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        logger.info("write_behind_stopped", **self.stats())
+
+    async def put(self, *rows: SQLModel):
+        for row in rows:
+            if self._queue.full():
+                self._stats["backpressure_waits"] += 1
+            await self._queue.put(row)
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    row = self._queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list[SQLModel]):
+        self._in_flight = len(batch)
+        started = time.perf_counter()
+        try:
+            try:
+                async for attempt in AsyncRetrying(
+                    stop=stop_after_attempt(self.max_attempts),
+                    wait=wait_exponential(multiplier=0.1, max=2),
+                    reraise=True,
+                ):
+                    with attempt:
+                        if attempt.retry_state.attempt_number > 1:
+                            logger.warning("write_behind_flush_retry", attempt=attempt.retry_state.attempt_number, rows=len(batch))
+                        await self._commit(batch)
+                self._stats["flushed_rows"] += len(batch)
+            except Exception as e:
+                # one bad row fails the whole transaction, so the rest are committed one at a time
+                logger.error("write_behind_flush_failed", rows=len(batch), error=str(e))
+                self._stats["row_fallbacks"] += 1
+                await self._flush_rows(batch)
+        finally:
+            self._in_flight = 0
+        STAGE_LATENCY.labels("db", "write_behind_flush").observe(time.perf_counter() - started)
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._stats["flushes"] += 1
+        self._stats["last_flush_ms"] = elapsed_ms
+        self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], elapsed_ms)
+        logger.debug("write_behind_flush", rows=len(batch), flush_ms=elapsed_ms, pending=self.pending)
+
+    async def _flush_rows(self, batch: list[SQLModel]):
+        for row in batch:
+            try:
+                await self._commit([row])
+            except Exception as e:
+                self._stats["failed_rows"] += 1
+                logger.error(
+                    "write_behind_row_dropped",
+                    table=row.__tablename__,
+                    row_id=str(getattr(row, "id", None)),
+                    row=row.model_dump(mode="json"),
+                    error=str(e),
+                )
+            else:
+                self._stats["flushed_rows"] += 1
+
+    @staticmethod
+    async def _commit(rows: list[SQLModel]):
+        # a failed commit rolls back on exit, which detaches the rows so they can be added again
+        async with AsyncSessionLocal() as session:
+            session.add_all(rows)
+            await session.commit()
+
+    @property
+    def pending(self) -> int:
+        # rows accepted by put() that are not yet committed
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + self._in_flight
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending_rows": self.pending}
+
+
+write_behind = WriteBehindWriter(
+    max_queue=settings.write_behind_max_queue,
+    batch_size=settings.write_behind_batch_size,
+    flush_interval_ms=settings.write_behind_flush_interval_ms,
+    max_attempts=settings.write_behind_max_attempts,
+)
+register_stats("write_behind", write_behind.stats)
+
+
+async def persist(*rows: SQLModel):
+    """Store rows through the write-behind queue when it is running, otherwise commit them right away."""
+    if write_behind.running:
+        await write_behind.put(*rows)
+        return
+    with timed("db", "commit"):
+        async with AsyncSessionLocal() as session:
+            try:
+                session.add_all(rows)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
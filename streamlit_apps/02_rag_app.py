@@ -1,5 +1,6 @@
 import streamlit as st
 import httpx
+import json
 from uuid import uuid4
 
 st.title("Assessment 2: Company-Specific RAG Chatbot")
@@ -22,27 +23,48 @@ if prompt := st.chat_input("Ask anything about the company..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            try:
-                resp = httpx.post(
-                    "http://localhost:8000/api/02-rag/chat",
-                    json={"query": prompt, "company_id": "acme-corp", "session_id": str(st.session_state.session_id)},
-                    timeout=30,
-                )
+        placeholder = st.empty()
+        status = st.empty()
+        status.caption("Thinking...")
+        try:
+            answer, event, meta = "", None, {}
+            with httpx.stream(
+                "POST",
+                "http://localhost:8000/api/02-rag/chat/stream",
+                json={"query": prompt, "company_id": "acme-corp", "session_id": str(st.session_state.session_id)},
+                timeout=60,
+            ) as resp:
                 if resp.status_code != 200:
                     # show full response when it's an error
+                    resp.read()
                     st.error(f"API error ({resp.status_code}): {resp.text}")
                 else:
-                    data = resp.json()
-                    try:
-                        st.markdown(data["answer"])
-                        st.caption(f"Confidence: {data['confidence']:.3f} | Sources: {', '.join(data['sources'])}")
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": data["answer"],
-                            "confidence": data["confidence"]
-                        })
-                    except KeyError:
-                        st.error(f"Unexpected response format: {data}")
-            except Exception as e:
-                st.error(f"Error: {e}")
\ No newline at end of file
+                    # minimal SSE parsing: "event: <name>" followed by "data: <json>"
+                    for line in resp.iter_lines():
+                        if line.startswith("event:"):
+                            event = line[len("event:"):].strip()
+                        elif line.startswith("data:"):
+                            data = json.loads(line[len("data:"):])
+                            if event == "retrieval":
+                                status.caption(f"Found {len(data['sources'])} source(s), generating...")
+                            elif event == "token":
+                                answer += data["text"]
+                                placeholder.markdown(answer + "▌")
+                            elif event == "done":
+                                meta = data
+                            elif event == "error":
+                                st.error(f"Error: {data['detail']}")
+
+            if meta:
+                placeholder.markdown(meta["answer"])
+                status.caption(
+                    f"Confidence: {meta['confidence']:.3f} | Sources: {', '.join(meta['sources'])}"
+                    f" | First token: {meta['ttft_ms']} ms"
+                )
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": meta["answer"],
+                    "confidence": meta["confidence"]
+                })
+        except Exception as e:
+            st.error(f"Error: {e}")